@@ -1,4 +1,5 @@
-﻿from pathlib import Path
+﻿import os
+from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -47,10 +48,34 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'config.wsgi.application'
 
+# SQLite tuning, run on every new connection. WAL lets readers carry on while
+# a write is in progress; busy_timeout makes a blocked writer wait for the lock
+# instead of failing with "database is locked"; synchronous=normal is safe in
+# WAL (an OS crash may lose the last commits, never corrupt the file).
+# Override an entry per environment with SQLITE_<NAME>, e.g. SQLITE_MMAP_SIZE=0.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,  # ms
+    'cache_size': -64000,  # negative = KiB, per connection
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'memory',
+}
+for _name in SQLITE_PRAGMAS:
+    if f'SQLITE_{_name.upper()}' in os.environ:
+        SQLITE_PRAGMAS[_name] = os.environ[f'SQLITE_{_name.upper()}']
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        # WAL keeps -wal/-shm files next to the database, so mount its directory, not the file
+        'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        'OPTIONS': {
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+            # Take the write lock at BEGIN: a transaction that reads and then
+            # writes can otherwise fail at once instead of waiting its turn
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
@@ -70,6 +95,56 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # For geopy/Nominatim auto-geocoding
 GEOCODER_USER_AGENT = "traveler-app"
+# Seconds before a cached "not found" geocode is retried
+STAYS_GEOCODE_NEGATIVE_TTL = 7 * 24 * 3600
+# Geocode stays saved without coordinates in a background thread
+STAYS_GEOCODE_ON_SAVE = True
+# Remote geocoder requests per second, for all web workers and commands together
+STAYS_GEOCODE_RATE = 1.0
+# Parallel remote lookups in backfill_geocode (raise only for a self-hosted provider)
+STAYS_GEOCODE_CONCURRENCY = 1
+# Provider class and its options, e.g. {"domain": "localhost:8080", "scheme": "http"}
+STAYS_GEOCODER = "stays.geocoding.NominatimProvider"
+STAYS_GEOCODER_OPTIONS = {}
+
+# On-disk cache for /stays/tiles/{z}/{x}/{y}.mvt, one directory per data version
+STAYS_TILE_CACHE_DIR = BASE_DIR / 'tile_cache'
+
+# Pre-encoded (json/gzip/brotli) snapshot of the unfiltered /stays/map-data/ payload
+STAYS_SNAPSHOT_DIR = BASE_DIR / 'snapshot_cache'
+
+# Threads per web process that run queued CSV imports; set to 0 and run
+# `manage.py run_import_jobs` to import in a separate worker instead
+STAYS_IMPORT_WORKERS = 1
+# A running import that hasn't reported progress for this long lost its worker
+# (restart, deploy) and is queued again
+STAYS_IMPORT_STALE_SECONDS = 600
+
+# Delta exports (?since=) stop SQLite's busy_timeout plus this many seconds
+# short of now: a save() stamps updated_at before it waits for the write lock,
+# so its commit can land up to busy_timeout later than its timestamp
+STAYS_DELTA_SAFETY_SECONDS = 2
+
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    # Rendered list/map/chart responses (stays/response_cache.py). On disk so
+    # every gunicorn worker shares the entries and the stampede lock; a local
+    # Redis does the same across hosts (needs the `redis` package):
+    #   'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+    #   'LOCATION': 'redis://127.0.0.1:6379/1',
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('STAYS_RESPONSE_CACHE_DIR', BASE_DIR / 'response_cache'),
+    },
+}
+
+# Cache alias for whole-response caching; None switches it off
+STAYS_RESPONSE_CACHE = 'responses'
+# Seconds a cached response is served fresh (then as long again while one request refreshes it);
+# keys include the data version, so writes never wait for this
+STAYS_RESPONSE_CACHE_TIMEOUT = 300
+# Streamed responses larger than this are passed through without being stored
+STAYS_RESPONSE_CACHE_MAX_BYTES = 2 * 1024 * 1024
 
 
 STATICFILES_DIRS = [BASE_DIR / 'static']
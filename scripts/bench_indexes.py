@@ -0,0 +1,143 @@
+"""
+Benchmark the Stay indexes on a throwaway SQLite database.
+
+Builds a stays table with the same DDL Django would create, fills it with
+synthetic rows, then runs the list / filter / export / map queries twice:
+once with only the primary key and once with the indexes declared on
+Stay.Meta. Prints EXPLAIN QUERY PLAN and the median latency for each.
+
+    python scripts/bench_indexes.py                 # 1,000,000 rows
+    python scripts/bench_indexes.py --rows 200000 --db /tmp/bench.sqlite3
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.db.models import Q  # noqa: E402
+from stays.models import Stay  # noqa: E402
+
+STATES = ["TX", "OK", "NM", "CO", "AZ", "UT", "WY", "MT", "SD", "NE", "KS", "MO", "AR", "LA", "CA", "OR", "WA", "ID", "NV", "FL"]
+CITIES = [f"City {i}" for i in range(2000)]
+
+
+def collect_ddl():
+    """(create table statements, create index statements) for Stay."""
+    connection.settings_dict["NAME"] = ":memory:"  # never touch the real db.sqlite3
+    with connection.schema_editor(collect_sql=True) as editor:
+        editor.create_model(Stay)
+    table = [s for s in editor.collected_sql if not s.startswith("CREATE INDEX")]
+    indexes = [s for s in editor.collected_sql if s.startswith("CREATE INDEX")]
+    return table, indexes
+
+
+def populate(db, rows):
+    rnd = random.Random(42)
+    start = date(2005, 1, 1)
+
+    def gen():
+        for i in range(1, rows + 1):
+            check_in = start + timedelta(days=rnd.randint(0, 20 * 365))
+            nights = rnd.randint(1, 14)
+            geocoded = rnd.random() < 0.8
+            yield (
+                i, "", f"Park {i}", rnd.choice(CITIES), rnd.choice(STATES),
+                check_in.isoformat(), (check_in + timedelta(days=nights)).isoformat(),
+                nights, "35.00", str(Decimal(35 * nights)), None, rnd.random() < 0.5,
+                None, rnd.randint(1, 5), False,
+                f"{rnd.uniform(25, 49):.6f}" if geocoded else None,
+                f"{rnd.uniform(-124, -67):.6f}" if geocoded else None,
+                updated_at,
+            )
+
+    updated_at = datetime.now(timezone.utc).isoformat(sep=" ")
+    cols = ("id, photo, park, city, state, check_in, leave, nights, rate_per_night, total, fees, "
+            "paid, site, rating, elect_extra, latitude, longitude, updated_at")
+    with db:
+        db.executemany(f"INSERT INTO stays_stay ({cols}) VALUES ({', '.join('?' * 18)})", gen())
+
+
+def queries():
+    page = 51
+    yield "list page 1", Stay.objects.order_by("-check_in", "-id")[:page]
+    yield "list deep page", (Stay.objects.filter(check_in__lte=date(2010, 6, 1))
+                             .filter(Q(check_in__lt=date(2010, 6, 1)) | Q(id__lt=1))
+                             .order_by("-check_in", "-id")[:page])
+    yield "filter state", Stay.objects.filter(state__in=["TX"]).order_by("-check_in", "-id")[:page]
+    yield "filter city", Stay.objects.filter(city__in=["City 7"]).order_by("-check_in", "-id")[:page]
+    yield "filter rating", Stay.objects.filter(rating__in=[5]).order_by("-check_in", "-id")[:page]
+    yield "export year", Stay.objects.filter(check_in__year=2015).order_by("check_in", "city").values_list("id", "city")
+    yield "map geocoded", (Stay.objects.exclude(latitude__isnull=True).exclude(longitude__isnull=True)
+                           .filter(latitude__range=(36, 37), longitude__range=(-100, -98))
+                           .values_list("id", "latitude", "longitude").order_by())
+
+
+def to_sql(qs):
+    sql, params = qs.query.sql_with_params()
+    return sql.replace("%s", "?"), [p.isoformat() if isinstance(p, date) else str(p) if isinstance(p, Decimal) else p for p in params]
+
+
+def run(db, label, repeat):
+    print(f"\n=== {label} ===")
+    for name, qs in queries():
+        sql, params = to_sql(qs)
+        plan = db.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+        timings = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            db.execute(sql, params).fetchall()
+            timings.append((time.perf_counter() - t0) * 1000)
+        print(f"\n-- {name}: median {statistics.median(timings):.2f} ms over {repeat} runs")
+        for row in plan:
+            print(f"   {row[-1]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--db", default=None, help="SQLite file to build (default: temp file)")
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), "bench.sqlite3")
+    if os.path.exists(path):
+        os.remove(path)
+    db = sqlite3.connect(path)
+    table, indexes = collect_ddl()
+    for stmt in table:
+        db.execute(stmt)
+
+    t0 = time.perf_counter()
+    populate(db, args.rows)
+    print(f"Inserted {args.rows} rows into {path} in {time.perf_counter() - t0:.1f}s")
+    db.execute("ANALYZE")
+    run(db, "before (primary key only)", args.repeat)
+
+    t0 = time.perf_counter()
+    with db:
+        for stmt in indexes:
+            db.execute(stmt)
+        db.execute("ANALYZE")
+    print(f"\nCreated {len(indexes)} indexes in {time.perf_counter() - t0:.1f}s")
+    run(db, "after (Stay.Meta.indexes)", args.repeat)
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
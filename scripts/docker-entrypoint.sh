@@ -0,0 +1,35 @@
+#!/bin/sh
+# Container start: make sure the SQLite database is where SQLITE_PATH points,
+# migrate, then serve.
+#
+# Deployments from before the ./data volume kept the database in
+# ./db.sqlite3; docker-compose mounts the project directory read-only at
+# /app/legacy so that file is copied (SQLite online backup) into ./data the
+# first time. Without either file the container refuses to start rather
+# than migrating a new, empty database past the real one.
+set -e
+
+DB="${SQLITE_PATH:-/app/db.sqlite3}"
+LEGACY="${SQLITE_LEGACY_PATH:-/app/legacy/db.sqlite3}"
+
+if [ ! -s "$DB" ]; then
+    if [ -f "$LEGACY" ] && [ -s "$LEGACY" ]; then
+        echo "Copying $LEGACY to $DB (one-time move to the data volume)"
+        mkdir -p "$(dirname "$DB")"
+        python - "$LEGACY" "$DB" <<'PY'
+import sqlite3, sys
+src = sqlite3.connect(f"file:{sys.argv[1]}?mode=ro", uri=True)
+dst = sqlite3.connect(sys.argv[2])
+src.backup(dst)
+dst.close()
+src.close()
+PY
+    elif [ "${SQLITE_CREATE:-}" != "1" ]; then
+        echo "No database at $DB (and none at $LEGACY)." >&2
+        echo "Put your db.sqlite3 in ./data, or set SQLITE_CREATE=1 to start a new one." >&2
+        exit 1
+    fi
+fi
+
+python manage.py migrate
+exec gunicorn config.wsgi:application --bind 0.0.0.0:8000 --workers 3 --timeout 60
@@ -0,0 +1,156 @@
+"""
+Stress a throwaway SQLite database with concurrent readers and writers.
+
+Runs the same workload twice, each time on a fresh file: with SQLite's
+defaults (rollback journal, deferred BEGIN), then with the SQLITE_PRAGMAS
+profile from config/settings.py and BEGIN IMMEDIATE, as Django now opens
+connections. Reader processes page through the stays list and the stays of
+one state, like the gunicorn workers. Writer processes commit import-sized
+batches: read the current max id, then insert. Each run prints read latency
+percentiles and how many reads and writes failed with "database is locked".
+
+    python scripts/stress_sqlite.py                      # 3 readers, 2 writers, 10 s
+    python scripts/stress_sqlite.py --readers 6 --writers 1 --seconds 20
+    SQLITE_SYNCHRONOUS=full python scripts/stress_sqlite.py   # try another profile
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+
+STATES = ["TX", "OK", "NM", "CO", "AZ", "UT", "WY", "MT", "SD", "NE", "KS", "MO", "AR", "LA", "CA", "OR", "WA", "ID", "NV", "FL"]
+
+READS = [
+    "SELECT id, park, city, state, check_in, nights FROM stays ORDER BY check_in DESC, id DESC LIMIT 51",
+    "SELECT id, park, city, state, check_in, nights FROM stays WHERE state = 'TX' ORDER BY id DESC LIMIT 51",
+]
+
+
+def connect(path, pragmas):
+    db = sqlite3.connect(path, timeout=5, isolation_level=None)
+    for name, value in pragmas.items():
+        db.execute(f"PRAGMA {name}={value}")
+    return db
+
+
+def build(path, rows):
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE stays (id INTEGER PRIMARY KEY, park TEXT, city TEXT, state TEXT, "
+               "check_in TEXT, nights INTEGER, total TEXT)")
+    db.execute("CREATE INDEX stays_check_in ON stays (check_in, id)")
+    db.execute("CREATE INDEX stays_state ON stays (state)")
+    rnd = random.Random(42)
+    with db:
+        db.executemany("INSERT INTO stays VALUES (?, ?, ?, ?, ?, ?, ?)", (
+            (i, f"Park {i}", f"City {rnd.randint(0, 2000)}", rnd.choice(STATES),
+             f"20{rnd.randint(5, 25):02d}-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}",
+             rnd.randint(1, 14), "35.00") for i in range(1, rows + 1)))
+    db.close()
+
+
+def reader(path, pragmas, deadline, results):
+    db = connect(path, pragmas)
+    timings, errors = [], 0
+    while time.monotonic() < deadline:
+        for sql in READS:
+            t0 = time.perf_counter()
+            try:
+                db.execute(sql).fetchall()
+            except sqlite3.OperationalError:
+                errors += 1
+                continue
+            timings.append((time.perf_counter() - t0) * 1000)
+    results.put(("read", timings, errors))
+
+
+def writer(path, pragmas, begin, batch, deadline, results):
+    db = connect(path, pragmas)
+    rnd = random.Random(os.getpid())
+    timings, errors = [], 0
+    while time.monotonic() < deadline:
+        t0 = time.perf_counter()
+        try:
+            db.execute(begin)
+            start = db.execute("SELECT COALESCE(MAX(id), 0) FROM stays").fetchone()[0] + 1
+            db.executemany("INSERT INTO stays VALUES (?, ?, ?, ?, ?, ?, ?)", (
+                (i, f"Import {i}", "City 1", rnd.choice(STATES), "2024-06-01", 2, "70.00")
+                for i in range(start, start + batch)))
+            db.execute("COMMIT")
+        except sqlite3.OperationalError:
+            errors += 1
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+            continue
+        timings.append((time.perf_counter() - t0) * 1000)
+    results.put(("write", timings, errors))
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run(label, path, pragmas, begin, args):
+    print(f"\n=== {label} ===")
+    print("   " + (", ".join(f"{k}={v}" for k, v in pragmas.items()) or "SQLite defaults") + f"; {begin}")
+    results = multiprocessing.Queue()
+    deadline = time.monotonic() + args.seconds
+    workers = [multiprocessing.Process(target=reader, args=(path, pragmas, deadline, results))
+               for _ in range(args.readers)]
+    workers += [multiprocessing.Process(target=writer, args=(path, pragmas, begin, args.batch, deadline, results))
+                for _ in range(args.writers)]
+    for w in workers:
+        w.start()
+    collected = {"read": ([], 0), "write": ([], 0)}
+    for _ in workers:
+        kind, timings, errors = results.get()
+        done, failed = collected[kind]
+        collected[kind] = (done + timings, failed + errors)
+    for w in workers:
+        w.join()
+    for kind, (timings, errors) in collected.items():
+        print(f"-- {kind}s: {len(timings)} ok, {errors} locked; "
+              f"median {statistics.median(timings) if timings else float('nan'):.2f} ms, "
+              f"p99 {percentile(timings, 99):.2f} ms, max {max(timings, default=float('nan')):.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000, help="Stays to start from")
+    parser.add_argument("--readers", type=int, default=3)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--batch", type=int, default=20000, help="Rows inserted per write transaction")
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    profiles = [
+        ("defaults: rollback journal, deferred BEGIN", {}, "BEGIN"),
+        ("tuned: settings.SQLITE_PRAGMAS, BEGIN IMMEDIATE", settings.SQLITE_PRAGMAS, "BEGIN IMMEDIATE"),
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, (label, pragmas, begin) in enumerate(profiles):
+            path = os.path.join(tmp, f"stress{i}.sqlite3")
+            build(path, args.rows)
+            run(label, path, pragmas, begin, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,21 @@
 from django.contrib import admin
-from .models import Stay
+from .models import GeocodeCache, ImportJob, Stay
 
 @admin.register(Stay)
 class StayAdmin(admin.ModelAdmin):
     list_display = ('id', '__str__')   # Add more once fields are stable
     list_filter = ()
     search_fields = ()
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'filename', 'status', 'processed', 'created', 'updated', 'skipped', 'created_at', 'finished_at')
+    list_filter = ('status',)
+    readonly_fields = ('processed', 'created', 'updated', 'skipped', 'error', 'started_at', 'finished_at')
+
+
+@admin.register(GeocodeCache)
+class GeocodeCacheAdmin(admin.ModelAdmin):
+    list_display = ('query', 'latitude', 'longitude', 'provider', 'updated_at')
+    search_fields = ('query',)
@@ -5,6 +5,9 @@ class StaysConfig(AppConfig):
     name = "stays"
 
     def ready(self):
+        # Import signal handlers
+        from . import signals  # noqa: F401
+
         try:
             from .utils.placeholders import ensure_placeholder_image
             ensure_placeholder_image()
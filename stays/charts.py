@@ -0,0 +1,147 @@
+"""
+Chart data engine behind /stays/charts/data/.
+
+One grouped query per request computes every series at once (conditional
+aggregation for the paid/unpaid split), grouped by state, rating or a
+check-in time bucket. Unfiltered state/rating/month/year charts that only
+need stays, nights or spend are read from the precomputed StayStat rows
+instead. The view's responses are cached per data version by
+stays/response_cache.py.
+"""
+from datetime import date
+from decimal import Decimal
+
+from django.db.models import Avg, Count, Q, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek, TruncYear
+
+from . import stats
+from .models import Stay, StayStat
+
+GROUPS = ("state", "rating", "time")
+BUCKETS = {"day": TruncDay, "week": TruncWeek, "month": TruncMonth, "year": TruncYear}
+SERIES = {
+    "nights": "Nights",
+    "spend": "Spend",
+    "paid_spend": "Spend (paid)",
+    "stays": "Stays",
+    "avg_rate": "Avg rate/night",
+}
+# Series StayStat carries, and the groupings it is kept by
+STAT_SERIES = {"stays", "nights", "spend"}
+
+
+def parse_params(query):
+    """
+    Normalized chart parameters from a QueryDict; raises ValueError for bad
+    values. Defaults give the original "nights per state" chart.
+    """
+    by = query.get("by") or "state"
+    if by not in GROUPS:
+        raise ValueError("by must be state, rating or time")
+    bucket = query.get("bucket") or "month"
+    if bucket not in BUCKETS:
+        raise ValueError("bucket must be day, week, month or year")
+    series = [s for s in (query.get("series") or "nights").split(",") if s]
+    if series == ["all"]:
+        series = list(SERIES)
+    if not series or any(s not in SERIES for s in series):
+        raise ValueError(f"series must be a comma list of {', '.join(SERIES)} (or all)")
+    filters = {}
+    for name in ("state", "city"):
+        if query.get(name):
+            filters[name] = query.get(name)
+    for name in ("rating", "year"):
+        if query.get(name):
+            filters[name] = int(query.get(name))
+    if "year" in filters and not 1 <= filters["year"] <= 9998:
+        raise ValueError("year must be between 1 and 9998")
+    for name in ("from", "to"):
+        if query.get(name):
+            filters[name] = date.fromisoformat(query.get(name)).isoformat()
+    return {"by": by, "bucket": bucket if by == "time" else None, "series": series, "filters": filters}
+
+
+def _queryset(filters):
+    qs = Stay.objects.order_by()
+    if "state" in filters:
+        qs = qs.filter(state=filters["state"])
+    if "city" in filters:
+        qs = qs.filter(city=filters["city"])
+    if "rating" in filters:
+        qs = qs.filter(rating=filters["rating"])
+    if "year" in filters:
+        y = filters["year"]
+        qs = qs.filter(check_in__gte=date(y, 1, 1), check_in__lt=date(y + 1, 1, 1))
+    if "from" in filters:
+        qs = qs.filter(check_in__gte=filters["from"])
+    if "to" in filters:
+        qs = qs.filter(check_in__lte=filters["to"])
+    return qs
+
+
+def _label(by, bucket, value):
+    if value is None or value == "":
+        return "—"
+    if by == "time":
+        if bucket == "year":
+            return f"{value:%Y}"
+        if bucket == "month":
+            return f"{value:%Y-%m}"
+        return value.isoformat()
+    return str(value)
+
+
+def _number(value):
+    if value is None:
+        return 0
+    if isinstance(value, Decimal):
+        return float(round(value, 2))
+    return value
+
+
+def _from_stats(params):
+    """Rows from StayStat when it can answer the request, else None."""
+    by, bucket = params["by"], params["bucket"]
+    if params["filters"] or not set(params["series"]) <= STAT_SERIES:
+        return None
+    if by == "state":
+        rows = stats.rows(StayStat.STATE)
+    elif by == "rating":
+        rows = sorted(stats.rows(StayStat.RATING), key=lambda r: (r[0] == "", int(r[0] or 0)))
+    elif bucket == "month":
+        rows = [r for r in stats.rows(StayStat.MONTH) if r[0]]
+    elif bucket == "year":
+        rows = stats.by_year()
+    else:
+        return None
+    return [(key or "—", {"stays": n, "nights": nights, "spend": spend}) for key, n, nights, spend in rows]
+
+
+def _from_sql(params):
+    by, bucket = params["by"], params["bucket"]
+    qs = _queryset(params["filters"])
+    group = by
+    if by == "time":
+        qs = qs.exclude(check_in__isnull=True).annotate(bucket=BUCKETS[bucket]("check_in"))
+        group = "bucket"
+    aggregates = {
+        "nights": Sum("nights"),
+        "spend": Sum("total"),
+        "paid_spend": Sum("total", filter=Q(paid=True)),
+        "stays": Count("id"),
+        "avg_rate": Avg("rate_per_night"),
+    }
+    rows = qs.values(group).annotate(**{s: aggregates[s] for s in params["series"]}).order_by(group)
+    return [(_label(by, bucket, r[group]), r) for r in rows]
+
+
+def compute(params):
+    rows = _from_stats(params)
+    if rows is None:
+        rows = _from_sql(params)
+    labels = [label for label, _ in rows]
+    datasets = [
+        {"key": s, "label": SERIES[s], "data": [_number(r.get(s)) for _, r in rows]}
+        for s in params["series"]
+    ]
+    return {"labels": labels, "datasets": datasets, "by": params["by"], "bucket": params["bucket"]}
@@ -0,0 +1,114 @@
+import math
+import threading
+
+from .models import Stay
+from .versioning import get_data_version
+
+# Clusters are cells of CELL_PX x CELL_PX screen pixels on a grid aligned to
+# the Web Mercator tiles, so the cells at zoom z + 1 exactly split the cells
+# at zoom z. Above CLUSTER_MAX_ZOOM the map gets plain points.
+CLUSTER_MAX_ZOOM = 16
+CELL_PX = 64
+_BITS = CLUSTER_MAX_ZOOM + 8 - int(math.log2(CELL_PX))  # cell grid bits at max zoom
+_MAX_LAT = 85.05112878
+
+
+def _grid_xy(lat, lng):
+    """Cell coordinates at CLUSTER_MAX_ZOOM for a point (Web Mercator)."""
+    lat = max(-_MAX_LAT, min(_MAX_LAT, lat))
+    x = (lng + 180.0) / 360.0
+    s = math.sin(math.radians(lat))
+    y = 0.5 - math.log((1 + s) / (1 - s)) / (4 * math.pi)
+    n = 1 << _BITS
+    return min(n - 1, max(0, int(x * n))), min(n - 1, max(0, int(y * n)))
+
+
+class ClusterIndex:
+    """
+    Grid clusters of the geocoded stays, per zoom level.
+
+    The points are read once per data version; each zoom level is built from
+    them the first time it is asked for and kept until a Stay changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._points = None
+        self._levels = {}
+
+    def _ensure(self):
+        version = get_data_version()
+        if self._version != version:
+            rows = (Stay.objects.exclude(latitude__isnull=True).exclude(longitude__isnull=True)
+                    .order_by().values_list("id", "latitude", "longitude"))
+            points = []
+            for pk, lat, lng in rows.iterator(chunk_size=5000):
+                lat, lng = float(lat), float(lng)
+                gx, gy = _grid_xy(lat, lng)
+                points.append((pk, lat, lng, gx, gy))
+            self._points = points
+            self._levels = {}
+            self._version = version
+
+    def _build(self, zoom):
+        shift = CLUSTER_MAX_ZOOM - zoom
+        cells = {}
+        for pk, lat, lng, gx, gy in self._points:
+            key = (gx >> shift, gy >> shift)
+            c = cells.get(key)
+            if c is None:
+                cells[key] = [1, lat, lng, gx, gx, gy, gy, pk]
+            else:
+                c[0] += 1
+                c[1] += lat
+                c[2] += lng
+                c[3] = min(c[3], gx)
+                c[4] = max(c[4], gx)
+                c[5] = min(c[5], gy)
+                c[6] = max(c[6], gy)
+        clusters = []
+        for (cx, cy), (count, slat, slng, x0, x1, y0, y1, pk) in cells.items():
+            expansion = CLUSTER_MAX_ZOOM + 1
+            for z in range(zoom + 1, CLUSTER_MAX_ZOOM + 1):
+                s = CLUSTER_MAX_ZOOM - z
+                if x0 >> s != x1 >> s or y0 >> s != y1 >> s:
+                    expansion = z
+                    break
+            clusters.append({
+                "count": count,
+                "lat": slat / count,
+                "lng": slng / count,
+                "expansion_zoom": expansion,
+                "id": pk if count == 1 else None,
+                "cell": (cx, cy),
+            })
+        return clusters
+
+    def clusters(self, zoom, bbox=None):
+        """Clusters at `zoom` whose grid cell overlaps `bbox` (if given)."""
+        zoom = max(0, min(zoom, CLUSTER_MAX_ZOOM))
+        with self._lock:
+            self._ensure()
+            level = self._levels.get(zoom)
+            if level is None:
+                level = self._levels[zoom] = self._build(zoom)
+        if bbox is None:
+            return list(level)
+        shift = CLUSTER_MAX_ZOOM - zoom
+        min_lng, min_lat, max_lng, max_lat = bbox
+        x0, y0 = _grid_xy(max_lat, min_lng)
+        x1, y1 = _grid_xy(min_lat, max_lng)
+        x0, y0, x1, y1 = x0 >> shift, y0 >> shift, x1 >> shift, y1 >> shift
+        wraps = min_lng > max_lng
+        out = []
+        for c in level:
+            cx, cy = c["cell"]
+            if not y0 <= cy <= y1:
+                continue
+            if (cx >= x0 or cx <= x1) if wraps else (x0 <= cx <= x1):
+                out.append(c)
+        return out
+
+
+cluster_index = ClusterIndex()
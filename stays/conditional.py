@@ -0,0 +1,77 @@
+"""
+ETag / Last-Modified validators for the read views.
+
+@conditional("name") wraps Django's condition() decorator, so a request
+whose If-None-Match / If-Modified-Since still matches gets a 304 before the
+view runs any query or renders a template. Checking costs the data-version
+lookup plus two indexed MAX() queries:
+
+- ETag: weak, from the view name, the Stay data version and the normalized
+  query string (the same ingredients as the response cache keys).
+- Last-Modified: the latest Stay.updated_at or StayTombstone.deleted_at, so
+  deletions count as modifications too.
+
+@conditional_stay does the same for one stay from its own updated_at.
+Responses that leave Cache-Control unset get "no-cache": clients keep them
+but revalidate before reuse.
+"""
+import hashlib
+from functools import wraps
+
+from django.db.models import Max
+from django.views.decorators.http import condition
+
+from .models import Stay, StayTombstone
+from .response_cache import normalized_query
+from .versioning import get_data_version
+
+
+def latest_change():
+    """When a stay was last written or deleted (None when there never was one)."""
+    stamps = [
+        Stay.objects.aggregate(t=Max("updated_at"))["t"],
+        StayTombstone.objects.aggregate(t=Max("deleted_at"))["t"],
+    ]
+    stamps = [t for t in stamps if t is not None]
+    return max(stamps) if stamps else None
+
+
+def _revalidate(view):
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if not response.has_header("Cache-Control"):
+            response["Cache-Control"] = "no-cache"
+        return response
+    return wrapped
+
+
+def conditional(name):
+    """Validators for a view over the whole stays table (see module docstring)."""
+    def etag(request, *args, **kwargs):
+        raw = repr((normalized_query(request), args, sorted(kwargs.items())))
+        digest = hashlib.sha1(raw.encode()).hexdigest()[:16]
+        return f'W/"{name}-{get_data_version()}-{digest}"'
+
+    def last_modified(request, *args, **kwargs):
+        return latest_change()
+
+    def decorator(view):
+        return condition(etag_func=etag, last_modified_func=last_modified)(_revalidate(view))
+    return decorator
+
+
+def conditional_stay(view):
+    """Validators for a view of one stay, from the `pk` URL argument."""
+    def updated_at(request, pk, *args, **kwargs):
+        cached = getattr(request, "_stay_updated_at", None)
+        if cached is None or cached[0] != pk:
+            value = Stay.objects.filter(pk=pk).values_list("updated_at", flat=True).first()
+            request._stay_updated_at = cached = (pk, value)
+        return cached[1]
+
+    def etag(request, pk, *args, **kwargs):
+        stamp = updated_at(request, pk)
+        return f'W/"stay-{pk}-{stamp.timestamp():.6f}"' if stamp else None
+
+    return condition(etag_func=etag, last_modified_func=updated_at)(_revalidate(view))
@@ -0,0 +1,90 @@
+"""
+Delta exports: only the stays changed since a watermark token.
+
+A token encodes the upper end of the window its export covered. Each
+export covers (since, until], where `until` trails the clock by the
+longest a stamped write can take to commit: it may wait out SQLite's
+busy_timeout for the write lock after updated_at was set, so the lag is
+that timeout plus STAYS_DELTA_SAFETY_SECONDS. A write stamped before the
+export but committed after it then still falls in the next window. Deletions come
+from StayTombstone and are listed before the changed rows; apply them
+first, then upsert the changed rows by id.
+"""
+import base64
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .exporting import FETCH_SIZE, ROWS_PER_CHUNK, STAY_FIELDS
+from .models import Stay, StayTombstone
+
+DELTA_FIELDS = ("op", "changed_at") + STAY_FIELDS
+UPSERT, DELETE = "upsert", "delete"
+
+
+def make_token(until: datetime) -> str:
+    return base64.urlsafe_b64encode(until.isoformat().encode()).decode().rstrip("=")
+
+
+def parse_token(token: str) -> datetime:
+    """The watermark in a token; ValueError when it is not one of ours."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        value = datetime.fromisoformat(raw)
+    except Exception:
+        raise ValueError("invalid since token")
+    if timezone.is_naive(value) and settings.USE_TZ:
+        raise ValueError("invalid since token")
+    return value
+
+
+def safety_lag() -> timedelta:
+    """How far `until` trails the clock (see module docstring)."""
+    # 5000 ms: Python's sqlite3 default timeout when no pragma sets one
+    busy_ms = int(getattr(settings, "SQLITE_PRAGMAS", {}).get("busy_timeout", 5000))
+    return timedelta(milliseconds=busy_ms,
+                     seconds=getattr(settings, "STAYS_DELTA_SAFETY_SECONDS", 2))
+
+
+def window(since_token=None):
+    """(since or None, until) for an export starting now."""
+    since = parse_token(since_token) if since_token else None
+    until = timezone.now() - safety_lag()
+    if since is not None and since > until:
+        until = since  # asked again within the safety lag: empty window
+    return since, until
+
+
+def delta_rows(since, until):
+    """
+    Row tuples in DELTA_FIELDS order: tombstones first, then upserts, each
+    ordered by change time. With since=None every current stay is listed
+    (a full snapshot to start syncing from) and no deletions.
+    """
+    if since is not None:
+        tombstones = (StayTombstone.objects.filter(deleted_at__gt=since, deleted_at__lte=until)
+                      .order_by("deleted_at", "stay_id").values_list("stay_id", "deleted_at"))
+        blanks = (None,) * (len(STAY_FIELDS) - 1)
+        for stay_id, deleted_at in tombstones.iterator(chunk_size=FETCH_SIZE):
+            yield (DELETE, deleted_at, stay_id) + blanks
+    changed = Stay.objects.filter(updated_at__lte=until)
+    if since is not None:
+        changed = changed.filter(updated_at__gt=since)
+    for row in (changed.order_by("updated_at", "id").values_list("updated_at", *STAY_FIELDS)
+                .iterator(chunk_size=FETCH_SIZE)):
+        yield (UPSERT,) + row
+
+
+def ndjson_chunks(rows, names=DELTA_FIELDS):
+    """One JSON object per line; decimals and dates as strings."""
+    encoder = DjangoJSONEncoder(separators=(",", ":"))
+    buf = []
+    for row in rows:
+        buf.append(encoder.encode(dict(zip(names, row))))
+        if len(buf) >= ROWS_PER_CHUNK:
+            yield ("\n".join(buf) + "\n").encode("utf-8")
+            buf.clear()
+    if buf:
+        yield ("\n".join(buf) + "\n").encode("utf-8")
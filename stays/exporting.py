@@ -0,0 +1,204 @@
+"""
+Streaming exports.
+
+Rows come straight from values_list(...).iterator(), are formatted a few
+hundred at a time and handed to a StreamingHttpResponse, so the download
+starts immediately and memory stays flat however many stays there are.
+
+Parquet output needs the optional `pyarrow` package. It is written one
+record batch (row group) at a time with typed columns: dates as date32,
+money as decimal128, coordinates as float64.
+"""
+import csv
+import zlib
+
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+
+from .snapshot import accepted_encodings
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except Exception:  # optional
+    pa = pq = None
+
+# Rows per yielded chunk; ~50 KB of CSV
+ROWS_PER_CHUNK = 500
+# DB rows fetched per round trip
+FETCH_SIZE = 2000
+
+
+class _Line:
+    """File-like sink for csv.writer that hands back what it was given."""
+
+    def write(self, value):
+        return value
+
+
+def csv_chunks(header, rows):
+    """UTF-8 encoded CSV, one bytes chunk per ROWS_PER_CHUNK rows."""
+    writer = csv.writer(_Line())
+    yield writer.writerow(header).encode("utf-8")
+    buf = []
+    for row in rows:
+        buf.append(writer.writerow(row))
+        if len(buf) >= ROWS_PER_CHUNK:
+            yield "".join(buf).encode("utf-8")
+            buf.clear()
+    if buf:
+        yield "".join(buf).encode("utf-8")
+
+
+def gzip_chunks(chunks, level=6):
+    """Compress a stream of bytes chunks into one gzip member, incrementally."""
+    z = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        out = z.compress(chunk)
+        if out:
+            yield out
+    yield z.flush()
+
+
+def wants_gzip(request) -> bool:
+    """?gzip=1 and the client accepts gzip content coding."""
+    if request.GET.get("gzip") not in ("1", "true", "yes"):
+        return False
+    accepted = accepted_encodings(request)
+    return "gzip" in accepted or "*" in accepted
+
+
+def stream_response(request, chunks, content_type, filename):
+    """
+    StreamingHttpResponse for an iterable of bytes chunks, compressed on
+    the fly when the request asks for gzip (see wants_gzip).
+    """
+    compress = wants_gzip(request)
+    response = StreamingHttpResponse(gzip_chunks(chunks) if compress else chunks, content_type=content_type)
+    if compress:
+        response["Content-Encoding"] = "gzip"
+    patch_vary_headers(response, ("Accept-Encoding",))
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def csv_response(request, filename, header, rows):
+    return stream_response(request, csv_chunks(header, rows), "text/csv; charset=utf-8", filename)
+
+
+# Rows per Parquet record batch / row group
+PARQUET_BATCH_SIZE = 65536
+
+
+def year_filtered(qs, year):
+    """`qs` limited to check-ins in `year` ("YYYY"); unchanged for anything else."""
+    if year and str(year).isdigit():
+        return qs.filter(check_in__year=int(year))
+    return qs
+
+
+# Exported stay columns, in order
+STAY_FIELDS = ("id", "park", "city", "state", "check_in", "leave", "nights", "rate_per_night",
+               "fees", "total", "paid", "site", "rating", "latitude", "longitude")
+
+
+def _arrow_types():
+    return {
+        "id": pa.int64(),
+        "park": pa.string(),
+        "city": pa.string(),
+        "state": pa.string(),
+        "check_in": pa.date32(),
+        "leave": pa.date32(),
+        "nights": pa.int32(),
+        "rate_per_night": pa.decimal128(8, 2),
+        "fees": pa.decimal128(10, 2),
+        "total": pa.decimal128(10, 2),
+        "paid": pa.bool_(),
+        "site": pa.string(),
+        "rating": pa.int32(),
+        "latitude": pa.float64(),
+        "longitude": pa.float64(),
+        # delta exports only
+        "op": pa.string(),
+        "changed_at": pa.timestamp("us", tz="UTC"),
+    }
+
+
+def parquet_schema(names=STAY_FIELDS):
+    types = _arrow_types()
+    return pa.schema([(name, types[name]) for name in names])
+
+
+def record_batches(rows, schema, batch_size=PARQUET_BATCH_SIZE):
+    """pyarrow RecordBatches of `schema` from an iterable of row tuples."""
+    floats = {i for i, field in enumerate(schema) if pa.types.is_floating(field.type)}
+    values = [[] for _ in schema]
+
+    def flush():
+        arrays = [pa.array(col, type=field.type) for col, field in zip(values, schema)]
+        for col in values:
+            col.clear()
+        return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+    for row in rows:
+        for i, value in enumerate(row):
+            values[i].append(float(value) if i in floats and value is not None else value)
+        if len(values[0]) >= batch_size:
+            yield flush()
+    if values[0]:
+        yield flush()
+
+
+def stay_rows(qs):
+    return qs.values_list(*STAY_FIELDS).iterator(chunk_size=FETCH_SIZE)
+
+
+class _Sink:
+    """Write-only file for ParquetWriter whose output is drained as it goes."""
+
+    def __init__(self):
+        self._parts = []
+        self._pos = 0
+        self.closed = False
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        parts, self._parts = self._parts, []
+        return parts
+
+
+def write_parquet(rows, where, schema=None, batch_size=PARQUET_BATCH_SIZE):
+    """Write row tuples as Parquet to a path or file object. Returns the row count."""
+    schema = schema or parquet_schema()
+    count = 0
+    with pq.ParquetWriter(where, schema, compression="zstd") as writer:
+        for batch in record_batches(rows, schema, batch_size):
+            writer.write_batch(batch)
+            count += batch.num_rows
+    return count
+
+
+def parquet_chunks(rows, schema=None, batch_size=PARQUET_BATCH_SIZE):
+    """Parquet file bytes for row tuples, yielded as each row group is written."""
+    schema = schema or parquet_schema()
+    sink = _Sink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    for batch in record_batches(rows, schema, batch_size):
+        writer.write_batch(batch)
+        yield from sink.drain()
+    writer.close()
+    yield from sink.drain()
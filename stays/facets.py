@@ -0,0 +1,93 @@
+import threading
+from collections import Counter
+
+from django.db.models import Count
+
+from .models import Stay
+from .versioning import get_data_version
+
+FACET_FIELDS = ("state", "city", "rating")
+
+
+def _clean(value):
+    if value is None or value == "":
+        return None
+    return value
+
+
+class FacetCache:
+    """
+    In-process copy of the filter choices for the stay list.
+
+    Holds the distinct states/cities/ratings with a row count for each value.
+    Built with one GROUP BY per field the first time it is needed, then kept
+    current by the Stay save/delete signals. If another process changed the
+    data (the shared data version moved under us) it is reloaded on next use.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = None
+        self._version = None
+
+    def _load(self):
+        counts = {}
+        for field in FACET_FIELDS:
+            rows = (Stay.objects.exclude(**{f"{field}__isnull": True})
+                    .values_list(field).annotate(n=Count("id")).order_by())
+            counts[field] = Counter({value: n for value, n in rows if _clean(value) is not None})
+        return counts
+
+    def _current(self):
+        version = get_data_version()
+        with self._lock:
+            if self._counts is None or self._version != version:
+                self._counts = self._load()
+                self._version = version
+            return self._counts
+
+    def choices(self, field):
+        """Sorted distinct values for `field`."""
+        return sorted(self._current()[field])
+
+    def counts(self, field):
+        """[(value, count), ...] sorted by value."""
+        c = self._current()[field]
+        return [(value, c[value]) for value in sorted(c)]
+
+    def apply(self, old, new):
+        """
+        Move one row's facet values from `old` to `new` (dicts keyed by field,
+        either may be None for create/delete). Runs after the data version
+        receiver (stays/versioning.py) has bumped the version for this write.
+        """
+        version = get_data_version()
+        with self._lock:
+            if self._counts is None or self._version != version - 1:
+                # Missed someone else's write; rebuild lazily on next read.
+                self._counts = None
+                return
+            for field in FACET_FIELDS:
+                before = _clean((old or {}).get(field))
+                after = _clean((new or {}).get(field))
+                if before == after:
+                    continue
+                c = self._counts[field]
+                if before is not None:
+                    c[before] -= 1
+                    if c[before] <= 0:
+                        del c[before]
+                if after is not None:
+                    c[after] += 1
+            self._version = version
+
+    def invalidate(self):
+        with self._lock:
+            self._counts = None
+
+
+facets = FacetCache()
+
+
+def facet_values(instance):
+    return {field: getattr(instance, field, None) for field in FACET_FIELDS}
@@ -0,0 +1,119 @@
+"""
+Offline place centroids for the US and Canada.
+
+The gazetteer is a UTF-8 text file of "state|city<TAB>lat<TAB>lng" lines
+sorted bytewise by key (state-wide centroids have an empty city). It is
+memory-mapped on first use and searched by bisecting on line boundaries,
+so a lookup is O(log n) with nothing parsed up front and no network.
+
+The bundled stays/data/gazetteer.tsv holds the state/province centroids
+plus ~24,700 US and Canadian places with 500+ inhabitants, generated by
+`manage.py build_gazetteer` from GeoNames cities500 (CC BY 4.0, see
+stays/data/README.txt). Run it on US.txt / CA.txt for every populated place,
+however small.
+"""
+import mmap
+import re
+import unicodedata
+from pathlib import Path
+from threading import Lock
+from typing import Optional, Tuple
+
+from django.conf import settings
+
+US_STATES = {
+    "alabama": "AL", "alaska": "AK", "arizona": "AZ", "arkansas": "AR", "california": "CA",
+    "colorado": "CO", "connecticut": "CT", "delaware": "DE", "district of columbia": "DC",
+    "florida": "FL", "georgia": "GA", "hawaii": "HI", "idaho": "ID", "illinois": "IL",
+    "indiana": "IN", "iowa": "IA", "kansas": "KS", "kentucky": "KY", "louisiana": "LA",
+    "maine": "ME", "maryland": "MD", "massachusetts": "MA", "michigan": "MI", "minnesota": "MN",
+    "mississippi": "MS", "missouri": "MO", "montana": "MT", "nebraska": "NE", "nevada": "NV",
+    "new hampshire": "NH", "new jersey": "NJ", "new mexico": "NM", "new york": "NY",
+    "north carolina": "NC", "north dakota": "ND", "ohio": "OH", "oklahoma": "OK", "oregon": "OR",
+    "pennsylvania": "PA", "puerto rico": "PR", "rhode island": "RI", "south carolina": "SC",
+    "south dakota": "SD", "tennessee": "TN", "texas": "TX", "utah": "UT", "vermont": "VT",
+    "virginia": "VA", "washington": "WA", "west virginia": "WV", "wisconsin": "WI", "wyoming": "WY",
+}
+CA_PROVINCES = {
+    "alberta": "AB", "british columbia": "BC", "manitoba": "MB", "new brunswick": "NB",
+    "newfoundland and labrador": "NL", "newfoundland": "NL", "nova scotia": "NS",
+    "northwest territories": "NT", "nunavut": "NU", "ontario": "ON", "prince edward island": "PE",
+    "quebec": "QC", "saskatchewan": "SK", "yukon": "YT",
+}
+REGIONS = {**US_STATES, **CA_PROVINCES}
+
+# Spelled-out and abbreviated forms index the same way
+_WORDS = {"saint": "st", "sainte": "ste", "mount": "mt", "fort": "ft"}
+
+Coords = Tuple[float, float]
+
+_map = None
+_map_lock = Lock()
+
+
+def gazetteer_path() -> Path:
+    default = Path(__file__).resolve().parent / "data" / "gazetteer.tsv"
+    return Path(getattr(settings, "STAYS_GAZETTEER_PATH", default))
+
+
+def fold_name(text) -> str:
+    text = unicodedata.normalize("NFKD", str(text or "")).encode("ascii", "ignore").decode().lower()
+    return " ".join(_WORDS.get(w, w) for w in re.sub(r"[^a-z0-9]+", " ", text).split())
+
+
+def normalize_state(state) -> str:
+    """Two-letter code for "TX", "tx." or "Texas"; "" when unrecognized."""
+    folded = fold_name(state)
+    if len(folded) == 2:
+        return folded.upper()
+    return REGIONS.get(folded, "")
+
+
+def make_key(city, state) -> str:
+    return f"{normalize_state(state).lower()}|{fold_name(city)}"
+
+
+def _mapped():
+    global _map
+    if _map is None:
+        with _map_lock:
+            if _map is None:
+                try:
+                    with open(gazetteer_path(), "rb") as f:
+                        _map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                except (OSError, ValueError):  # missing or empty file
+                    _map = b""
+    return _map
+
+
+def _search(data, key: bytes) -> Optional[bytes]:
+    lo, hi = 0, len(data)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        start = data.rfind(b"\n", 0, mid) + 1
+        end = data.find(b"\n", start)
+        if end == -1:
+            end = len(data)
+        line = data[start:end]
+        found = line.split(b"\t", 1)[0]
+        if found == key:
+            return line
+        if found < key:
+            lo = end + 1
+        else:
+            hi = start
+    return None
+
+
+def lookup(city, state) -> Optional[Coords]:
+    """
+    Centroid of `city` in `state`, or of the state itself when city is
+    blank. None when the state is unknown or the place is not listed.
+    """
+    if not normalize_state(state):
+        return None
+    line = _search(_mapped(), make_key(city, state).encode("ascii"))
+    if line is None:
+        return None
+    _, lat, lng = line.decode("ascii").split("\t")
+    return (float(lat), float(lng))
@@ -0,0 +1,60 @@
+import math
+from typing import Optional, Tuple
+
+from django.db.models import Q
+
+MAX_ZOOM = 18
+
+BBox = Tuple[float, float, float, float]  # (min_lng, min_lat, max_lng, max_lat)
+
+
+def wrap_lng(lng: float) -> float:
+    return (lng + 180.0) % 360.0 - 180.0
+
+
+def parse_bbox(value: Optional[str]) -> Optional[BBox]:
+    """
+    Parse "minLng,minLat,maxLng,maxLat". Returns None when absent and raises
+    ValueError when malformed. Longitudes are wrapped into [-180, 180]; a box
+    crossing the antimeridian comes back with min_lng > max_lng.
+    """
+    if not value:
+        return None
+    parts = [float(p) for p in value.split(",")]
+    if len(parts) != 4 or not all(math.isfinite(p) for p in parts):
+        raise ValueError("bbox must be minLng,minLat,maxLng,maxLat")
+    min_lng, min_lat, max_lng, max_lat = parts
+    if min_lat > max_lat or min_lng > max_lng:
+        raise ValueError("bbox min must not exceed max")
+    min_lat, max_lat = max(min_lat, -90.0), min(max_lat, 90.0)
+    if max_lng - min_lng >= 360.0:
+        return (-180.0, min_lat, 180.0, max_lat)
+    return (wrap_lng(min_lng), min_lat, wrap_lng(max_lng), max_lat)
+
+
+def parse_zoom(value) -> Optional[int]:
+    try:
+        return max(0, min(int(value), MAX_ZOOM))
+    except (TypeError, ValueError):
+        return None
+
+
+def bbox_q(bbox: BBox, lat="latitude", lng="longitude") -> Q:
+    """Range predicates on the (indexed) coordinate columns."""
+    min_lng, min_lat, max_lng, max_lat = bbox
+    q = Q(**{f"{lat}__gte": min_lat, f"{lat}__lte": max_lat})
+    if min_lng <= max_lng:
+        return q & Q(**{f"{lng}__gte": min_lng, f"{lng}__lte": max_lng})
+    # Antimeridian: two longitude bands
+    return q & (Q(**{f"{lng}__gte": min_lng}) | Q(**{f"{lng}__lte": max_lng}))
+
+
+def zoom_precision(zoom: Optional[int]) -> int:
+    """
+    Decimal places worth sending at a zoom level (about a tenth of a screen
+    pixel); full precision when zoom is unknown.
+    """
+    if zoom is None:
+        return 6
+    degrees_per_pixel = 360.0 / (256 * 2 ** zoom)
+    return max(1, min(6, math.ceil(-math.log10(degrees_per_pixel / 10))))
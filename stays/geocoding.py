@@ -0,0 +1,251 @@
+"""
+Geocoding through a persistent cache.
+
+Every remote lookup goes through geocode(): the query is normalized, looked
+up in GeocodeCache, and only sent to the provider on a miss (or once a
+cached "not found" is older than STAYS_GEOCODE_NEGATIVE_TTL). Hits are also
+memoized per process, so a place shared by many stays costs one dict lookup
+after the first.
+
+A provider is any object with a `name` and a `geocode(query)` method that
+returns (lat, lng), None for "no such place", or raises GeocodingError when
+the service itself failed (those are not cached). STAYS_GEOCODER names the
+provider class and STAYS_GEOCODER_OPTIONS its keyword arguments, e.g.
+{"domain": "nominatim.internal:8080", "scheme": "http"} for a self-hosted
+Nominatim.
+"""
+import re
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+from decimal import Decimal
+from threading import Lock
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import GeocodeCache, RateLimit
+
+Coords = Tuple[float, float]
+
+MAX_MEMO = 10000
+
+_memo = {}
+_memo_lock = Lock()
+
+
+class GeocodingError(Exception):
+    """The provider could not be asked (not installed, network, quota)."""
+
+
+class NominatimProvider:
+    name = "nominatim"
+
+    def __init__(self, **options):
+        self.options = options
+        self._client = None
+
+    def _geolocator(self):
+        if self._client is None:
+            try:
+                from geopy.geocoders import Nominatim
+            except Exception as e:
+                raise GeocodingError("geopy is not installed") from e
+            user_agent = getattr(settings, "GEOCODER_USER_AGENT", "traveler-app")
+            self._client = Nominatim(**{"user_agent": user_agent, "timeout": 10, **self.options})
+        return self._client
+
+    def geocode(self, query: str) -> Optional[Coords]:
+        geolocator = self._geolocator()
+        try:
+            loc = geolocator.geocode(query)
+        except Exception as e:
+            raise GeocodingError(str(e)) from e
+        if not loc:
+            return None
+        return (loc.latitude, loc.longitude)
+
+
+class SharedRateLimit:
+    """
+    Allows `rate` calls per second on average with bursts of up to `burst`,
+    across every process sharing the database: each web worker's geocode thread and backfill_geocode draw on
+    one budget. Each acquire() reserves the next free slot with a single
+    UPDATE on a RateLimit row (GCRA: the row holds when the next call is
+    due) and sleeps until the slot comes up; `burst` calls may run early.
+    """
+
+    def __init__(self, name: str, rate: float, burst: int = 1):
+        self.name = name
+        self.interval = int(1_000_000 / float(rate))
+        self.burst = max(1, int(burst))
+
+    def _reserve(self, now: int) -> int:
+        """Book a call at or after `now` (microseconds); returns the new due time."""
+        table = connection.ops.quote_name(RateLimit._meta.db_table)
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"UPDATE {table} SET next_at = CASE WHEN next_at > %s THEN next_at ELSE %s END + %s "
+                    f"WHERE name = %s", [now, now, self.interval, self.name])
+                if not cursor.rowcount:
+                    try:
+                        with transaction.atomic():
+                            RateLimit.objects.create(name=self.name, next_at=now + self.interval)
+                        return now + self.interval
+                    except IntegrityError:  # created concurrently
+                        return self._reserve(now)
+                cursor.execute(f"SELECT next_at FROM {table} WHERE name = %s", [self.name])
+                return cursor.fetchone()[0]
+
+    def acquire(self):
+        now = time.time_ns() // 1000
+        due = self._reserve(now)
+        wait = due - self.burst * self.interval - now
+        if wait > 0:
+            time.sleep(wait / 1_000_000)
+
+
+def rate_limit() -> float:
+    """Remote lookups per second, for all processes together (Nominatim's public usage policy allows 1)."""
+    return float(getattr(settings, "STAYS_GEOCODE_RATE", 1.0))
+
+
+def shared_limiter(rate: Optional[float] = None, burst: int = 1) -> SharedRateLimit:
+    """The limiter every remote-geocoding path charges: STAYS_GEOCODE_RATE shared by all processes."""
+    return SharedRateLimit("geocoder", rate or rate_limit(), burst)
+
+
+def concurrency() -> int:
+    """Parallel remote lookups; raise only for self-hosted providers."""
+    return max(1, int(getattr(settings, "STAYS_GEOCODE_CONCURRENCY", 1)))
+
+
+_provider = None
+
+
+def get_provider():
+    global _provider
+    if _provider is None:
+        cls = import_string(getattr(settings, "STAYS_GEOCODER", "stays.geocoding.NominatimProvider"))
+        _provider = cls(**getattr(settings, "STAYS_GEOCODER_OPTIONS", {}))
+    return _provider
+
+
+def to_decimal(value) -> Optional[Decimal]:
+    """A coordinate as stored in the 6-decimal-place model fields."""
+    return None if value is None else Decimal(str(value)).quantize(Decimal("0.000001"))
+
+
+def normalize_query(query) -> str:
+    """"  Austin ,TX " and "austin, tx" share one cache row."""
+    text = unicodedata.normalize("NFKC", str(query or "")).lower()
+    parts = (re.sub(r"\s+", " ", p).strip(" .;") for p in text.split(","))
+    return ", ".join(p for p in parts if p)[:255]
+
+
+def negative_ttl() -> timedelta:
+    return timedelta(seconds=getattr(settings, "STAYS_GEOCODE_NEGATIVE_TTL", 7 * 24 * 3600))
+
+
+def _remember(key, coords):
+    with _memo_lock:
+        if len(_memo) >= MAX_MEMO:
+            _memo.clear()
+        _memo[key] = coords
+
+
+def lookup(query):
+    """
+    (cached, coords) for a query without calling the provider: cached is
+    False when the provider still has to be asked.
+    """
+    key = normalize_query(query)
+    if not key:
+        return True, None
+    if key in _memo:
+        return True, _memo[key]
+    row = GeocodeCache.objects.filter(query=key).first()
+    if row is None:
+        return False, None
+    if row.found:
+        coords = (float(row.latitude), float(row.longitude))
+        _remember(key, coords)
+        return True, coords
+    return row.updated_at > timezone.now() - negative_ttl(), None
+
+
+def store(query, coords: Optional[Coords], provider_name=""):
+    key = normalize_query(query)
+    if not key:
+        return
+    lat, lng = coords if coords else (None, None)
+    values = {"latitude": to_decimal(lat), "longitude": to_decimal(lng), "provider": provider_name}
+    try:
+        GeocodeCache.objects.update_or_create(query=key, defaults=values)
+    except IntegrityError:
+        pass  # a concurrent writer cached it first
+    if coords:
+        _remember(key, (float(values["latitude"]), float(values["longitude"])))
+
+
+def geocode(query, provider=None, limiter=None) -> Optional[Coords]:
+    """
+    (lat, lng) for a free-text query, or None. Served from the cache when
+    possible; provider failures return None and are not cached. A
+    `limiter` (a SharedRateLimit) is only charged for remote calls.
+    """
+    cached, coords = lookup(query)
+    if cached:
+        return coords
+    provider = provider or get_provider()
+    if limiter:
+        limiter.acquire()
+    try:
+        coords = provider.geocode(normalize_query(query))
+    except GeocodingError:
+        return None
+    store(query, coords, provider.name)
+    return coords
+
+
+def resolve_many(queries, provider=None, limiter=None, workers=1):
+    """
+    ({query: coords or None}, remote call count) for many queries, each
+    distinct normalized query resolved once. Cached answers are used as is;
+    the rest go to the provider from `workers` threads, every call charged
+    to `limiter`, and their answers are cached here on the calling thread.
+    Queries the provider failed on are left out of the result.
+    """
+    provider = provider or get_provider()
+    by_key = {}
+    for q in queries:
+        by_key.setdefault(normalize_query(q), []).append(q)
+    results, remote = {}, []
+    for key, originals in by_key.items():
+        cached, coords = lookup(key)
+        if cached:
+            results.update(dict.fromkeys(originals, coords))
+        else:
+            remote.append(key)
+
+    def ask(key):
+        if limiter:
+            limiter.acquire()
+        return provider.geocode(key)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(ask, key): key for key in remote}
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                coords = future.result()
+            except GeocodingError:
+                continue
+            store(key, coords, provider.name)
+            results.update(dict.fromkeys(by_key[key], coords))
+    return results, len(remote)
@@ -0,0 +1,100 @@
+"""
+Deferred geocoding for saved stays.
+
+Stay.save() no longer waits on the geocoder: the post_save signal queues the
+id of a stay saved without coordinates (the CSV importer queues each
+committed batch's), and one daemon thread per process
+drains the queue in batches. Each batch groups stays by query, resolves
+every distinct place once (offline gazetteer first, then the cached remote
+geocoder in stays/geocoding.py), charges only remote calls to the
+STAYS_GEOCODE_RATE limit that every process shares (SharedRateLimit), and
+writes the coordinates with one UPDATE per place.
+
+The queue itself is in memory; stays whose coordinates are still missing
+after a restart are picked up by `manage.py backfill_geocode`.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+from . import gazetteer
+from .geocoding import geocode, shared_limiter
+from .models import Stay
+from .utils import build_query_from_stay
+
+log = logging.getLogger(__name__)
+
+# Wait this long after the first queued id so bursts (imports, bulk edits)
+# are handled as one batch
+BATCH_DELAY = 0.5
+BATCH_SIZE = 200
+
+_pending = set()
+_cond = threading.Condition()
+_thread = None
+_limiter = None
+
+
+def enabled() -> bool:
+    return getattr(settings, "STAYS_GEOCODE_ON_SAVE", True)
+
+
+def enqueue(*pks):
+    global _thread
+    with _cond:
+        _pending.update(pks)
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(target=_worker, name="stays-geocode", daemon=True)
+            _thread.start()
+        _cond.notify()
+
+
+def pending_count() -> int:
+    with _cond:
+        return len(_pending)
+
+
+def _take_batch():
+    with _cond:
+        while not _pending:
+            _cond.wait()
+    time.sleep(BATCH_DELAY)
+    with _cond:
+        batch = [_pending.pop() for _ in range(min(BATCH_SIZE, len(_pending)))]
+    return batch
+
+
+def resolve(pks, limiter=None):
+    """
+    Geocode the given stays that still lack coordinates. Returns the number
+    of stays updated.
+    """
+    by_query = {}
+    for stay in Stay.objects.filter(pk__in=pks, latitude__isnull=True, longitude__isnull=True):
+        q = build_query_from_stay(stay)
+        if q:
+            by_query.setdefault(q, (stay, []))[1].append(stay.pk)
+    updated = 0
+    for q, (stay, ids) in by_query.items():
+        coords = gazetteer.lookup(stay.city, stay.state) or geocode(q, limiter=limiter)
+        if coords:
+            # Bypasses save() (and its signals) on purpose: only coordinates change
+            updated += Stay.objects.filter(pk__in=ids, latitude__isnull=True, longitude__isnull=True) \
+                .update(latitude=coords[0], longitude=coords[1])
+    return updated
+
+
+def _worker():
+    global _limiter
+    _limiter = _limiter or shared_limiter()
+    while True:
+        batch = _take_batch()
+        try:
+            resolve(batch, _limiter)
+        except Exception:
+            log.exception("Deferred geocoding of %d stays failed", len(batch))
+        finally:
+            connections.close_all()
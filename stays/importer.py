@@ -0,0 +1,271 @@
+"""
+Batched CSV import for stays.
+
+Rows are normalized, grouped into batches, matched against existing stays by
+the natural key (park, city, state, check_in, leave) with one query per
+batch, and written with bulk_create/bulk_update inside one transaction per
+batch. nights/total are derived exactly as Stay.save() does, but no per-row
+save() runs, so there is no per-row query, transaction or signal. Rows
+left without coordinates are handed to the geocode queue (stays/geoqueue.py)
+once their batch commits, as a saved stay would be. Chart totals
+(stays/stats.py) are moved once per batch.
+"""
+import codecs
+import csv
+import io
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Q
+
+from . import geoqueue, stats
+from .models import Stay
+from .stats import stat_values
+from .utils import build_query_from_stay
+
+BATCH_SIZE = 500
+
+# IntegerField's range (nights, rating), and Stay.total's max_digits
+INT_RANGE = (-2**31, 2**31 - 1)
+TOTAL_DIGITS = 10
+
+KEY_FIELDS = ("park", "city", "state", "check_in", "leave")
+
+# Accepted header spellings (lowercased) for each model field; the first
+# non-empty one wins
+COLUMNS = {
+    "park": ("park",),
+    "city": ("city",),
+    "state": ("state",),
+    "check_in": ("check in", "check_in", "checkin"),
+    "leave": ("leave", "leave_date", "check out", "checkout"),
+    "nights": ("nights", "# nts"),
+    "rate_per_night": ("rate/nt", "rate_per_night", "price/night", "price_per_night"),
+    "fees": ("fees",),
+    "paid": ("paid?", "paid"),
+    "site": ("site",),
+    "rating": ("rating",),
+    "latitude": ("latitude", "lat"),
+    "longitude": ("longitude", "lng", "lon"),
+}
+
+DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y", "%m-%d-%Y")
+
+# Bytes inspected to choose between UTF-8 and Windows-1252
+SNIFF_SIZE = 64 * 1024
+
+
+def _cp1252_fallback(err):
+    # Stray non-UTF-8 bytes past the sniffed sample (a hand-edited row in an
+    # otherwise UTF-8 export) are read as Windows-1252 instead of aborting.
+    return err.object[err.start:err.end].decode("cp1252", errors="replace"), err.end
+
+
+codecs.register_error("stays_cp1252", _cp1252_fallback)
+
+
+def detect_encoding(sample: bytes) -> str:
+    """"utf-8-sig" when the leading sample is valid UTF-8, else "cp1252"."""
+    try:
+        # final=False: a multi-byte character cut off by the sample is fine
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "utf-8-sig"
+    except UnicodeDecodeError:
+        return "cp1252"
+
+
+def open_csv(binary):
+    """
+    csv.DictReader over a seekable binary file object, decoded as a stream: only the
+    leading SNIFF_SIZE bytes are inspected to pick the encoding, so memory
+    stays constant however large the upload is.
+    """
+    encoding = detect_encoding(binary.read(SNIFF_SIZE))
+    binary.seek(0)
+    errors = "stays_cp1252" if encoding == "utf-8-sig" else "replace"
+    return csv.DictReader(io.TextIOWrapper(binary, encoding=encoding, errors=errors, newline=""))
+
+
+class RowError(ValueError):
+    pass
+
+
+def _date(value):
+    if not value:
+        return None
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            pass
+    raise RowError(f"bad date {value!r}")
+
+
+def _int(value):
+    if not value:
+        return None
+    try:
+        number = int(float(value))
+    except (ValueError, OverflowError):  # OverflowError: "inf"; ValueError also covers "nan"
+        raise RowError(f"bad number {value!r}")
+    if not INT_RANGE[0] <= number <= INT_RANGE[1]:
+        raise RowError(f"number out of range {value!r}")
+    return number
+
+
+def _decimal(value, places="0.01", max_digits=10):
+    if not value:
+        return None
+    try:
+        amount = Decimal(value.replace("$", "").replace(",", ""))
+        if not amount.is_finite():
+            raise InvalidOperation
+        amount = amount.quantize(Decimal(places))
+    except InvalidOperation:
+        raise RowError(f"bad amount {value!r}")
+    if len(amount.as_tuple().digits) > max_digits:
+        raise RowError(f"amount out of range {value!r}")
+    return amount
+
+
+def _bool(value):
+    return (value or "").lower() in ("yes", "true", "1", "y")
+
+
+CONVERTERS = {
+    "check_in": _date,
+    "leave": _date,
+    "nights": _int,
+    "rating": _int,
+    "rate_per_night": lambda v: _decimal(v, max_digits=8),
+    "fees": _decimal,
+    "paid": _bool,
+    "latitude": lambda v: _decimal(v, "0.000001", max_digits=9),
+    "longitude": lambda v: _decimal(v, "0.000001", max_digits=9),
+}
+
+
+def normalize_row(row):
+    """
+    Map one csv.DictReader row to {model field: value}, covering only the
+    columns present in the file. Returns None for a blank row and raises
+    RowError for a value that cannot be converted.
+    """
+    row = {(k or "").strip().lower().replace("\ufeff", ""): (v or "").strip()
+           for k, v in row.items() if k is not None}
+    if not any(row.values()):
+        return None
+    data = {}
+    for field, names in COLUMNS.items():
+        present = [row[name] for name in names if name in row]
+        if not present:
+            continue
+        value = next((v for v in present if v), "")
+        data[field] = CONVERTERS[field](value) if field in CONVERTERS else value
+    for field in ("park", "city", "state"):
+        data.setdefault(field, "")
+    data.setdefault("check_in", None)
+    data.setdefault("leave", None)
+    return data
+
+
+def _key(values):
+    return tuple(values.get(f) for f in KEY_FIELDS)
+
+
+def _existing(batch):
+    """Existing stays for a batch of normalized rows, by natural key (one query)."""
+    parks = {d["park"] for d in batch}
+    dates = [d["check_in"] for d in batch if d["check_in"] is not None]
+    when = Q(check_in__isnull=True) if len(dates) < len(batch) else Q()
+    if dates:
+        when |= Q(check_in__range=(min(dates), max(dates)))
+    found = {}
+    for obj in Stay.objects.filter(when, park__in=parks).order_by("-id"):
+        found[_key(obj.__dict__)] = obj  # lowest id wins on duplicate keys
+    return found
+
+
+def _total_fits(obj):
+    return obj.total is None or len(obj.total.as_tuple().digits) <= TOTAL_DIGITS
+
+
+def write_batch(batch):
+    """
+    Create or update one batch of normalized rows. A row whose derived total
+    does not fit Stay.total is left out. Returns (created, updated, skipped).
+    """
+    existing = _existing(batch)
+    to_create, to_update, stored = {}, {}, {}
+    fields = set()
+    skipped = 0
+    for data in batch:
+        key = _key(data)
+        obj = to_create.get(key) or to_update.get(key) or existing.get(key)
+        target = obj or Stay()
+        before = {f: getattr(target, f) for f in (*data, "nights", "total")}
+        old = stat_values(target)
+        for field, value in data.items():
+            setattr(target, field, value)
+        target.fill_derived_fields()
+        if not _total_fits(target):
+            for field, value in before.items():
+                setattr(target, field, value)
+            skipped += 1
+            continue
+        if obj is None:
+            to_create[key] = target
+        elif obj.pk is not None:
+            stored.setdefault(key, old)
+            to_update[key] = obj
+        fields.update(data)
+    fields = sorted((fields | {"nights", "total"}) - set(KEY_FIELDS))
+    with transaction.atomic():
+        if to_create:
+            Stay.objects.bulk_create(to_create.values())
+        if to_update:
+            Stay.objects.bulk_update(to_update.values(), fields, stats_handled=True)
+        stats.apply_many([(None, stat_values(obj)) for obj in to_create.values()]
+                         + [(stored[key], stat_values(obj)) for key, obj in to_update.items()])
+        if geoqueue.enabled():
+            pks = [obj.pk for obj in (*to_create.values(), *to_update.values())
+                   if obj.pk is not None and not obj.latitude and not obj.longitude
+                   and build_query_from_stay(obj)]
+            if pks:
+                transaction.on_commit(lambda: geoqueue.enqueue(*pks))
+    return len(to_create), len(to_update), skipped
+
+
+def import_rows(rows, batch_size=BATCH_SIZE, progress=None):
+    """
+    Import an iterable of csv.DictReader rows. Returns a dict with the
+    created/updated/skipped counts; `progress(stats)` is called per batch.
+    """
+    stats = {"created": 0, "updated": 0, "skipped": 0, "processed": 0}
+    batch = []
+
+    def flush():
+        created, updated, skipped = write_batch(batch)
+        stats["created"] += created
+        stats["updated"] += updated
+        stats["skipped"] += skipped
+        batch.clear()
+        if progress:
+            progress(stats)
+
+    for row in rows:
+        stats["processed"] += 1
+        try:
+            data = normalize_row(row or {})
+        except RowError:
+            data = None
+        if data is None:
+            stats["skipped"] += 1
+            continue
+        batch.append(data)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return stats
@@ -0,0 +1,144 @@
+"""
+Background CSV imports.
+
+The upload view only stores the file and queues an ImportJob; the rows are
+imported off the request by either
+
+* the in-process thread pool (default, STAYS_IMPORT_WORKERS threads per
+  web process), or
+* `manage.py run_import_jobs`, for deployments that set
+  STAYS_IMPORT_WORKERS = 0 and run a separate worker.
+
+A job is claimed with a conditional UPDATE on its status, so a job is never
+run twice even when both kinds of worker are active.
+
+A worker killed mid-import (a deploy or gunicorn restart ends pool threads
+without warning) leaves its job RUNNING. reap_stale() finds running jobs
+whose heartbeat is older than STAYS_IMPORT_STALE_SECONDS and queues them
+again. Re-importing is safe because rows are matched on their natural key.
+After MAX_ATTEMPTS the job is marked failed instead. The uploaded file is
+deleted once a job is done or failed.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from threading import Lock
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .importer import import_rows, open_csv
+from .models import ImportJob
+
+log = logging.getLogger(__name__)
+
+# Runs of one job before a worker dying on it marks it failed
+MAX_ATTEMPTS = 2
+
+_pool = None
+_pool_lock = Lock()
+
+
+def worker_count() -> int:
+    return int(getattr(settings, "STAYS_IMPORT_WORKERS", 1))
+
+
+def _executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=worker_count(), thread_name_prefix="stays-import")
+        return _pool
+
+
+def stale_after() -> timedelta:
+    return timedelta(seconds=getattr(settings, "STAYS_IMPORT_STALE_SECONDS", 600))
+
+
+def _schedule(pks):
+    if worker_count() > 0:
+        for pk in pks:
+            transaction.on_commit(lambda pk=pk: _executor().submit(_run_in_thread, pk))
+
+
+def enqueue(upload) -> ImportJob:
+    """Store an uploaded file as a queued ImportJob and schedule it."""
+    job = ImportJob.objects.create(file=upload, filename=getattr(upload, "name", "")[:255])
+    _schedule([job.pk] + reap_stale())
+    return job
+
+
+def requeue_stale():
+    """reap_stale(), handing the requeued jobs to this process's pool."""
+    _schedule(reap_stale())
+
+
+def claim(pk) -> bool:
+    now = timezone.now()
+    return bool(ImportJob.objects.filter(pk=pk, status=ImportJob.QUEUED)
+                .update(status=ImportJob.RUNNING, started_at=now, heartbeat_at=now, attempts=F("attempts") + 1))
+
+
+def _finish(job, **fields):
+    ImportJob.objects.filter(pk=job.pk).update(finished_at=timezone.now(), **fields)
+    if job.file:
+        job.file.delete(save=False)
+        ImportJob.objects.filter(pk=job.pk).update(file="")
+
+
+def reap_stale():
+    """
+    Requeue running jobs whose worker stopped reporting, or fail them after
+    MAX_ATTEMPTS. Returns the requeued ids (not yet scheduled).
+    """
+    stale = (ImportJob.objects.filter(status=ImportJob.RUNNING)
+             .filter(Q(heartbeat_at__lt=timezone.now() - stale_after())
+                     | Q(heartbeat_at__isnull=True, started_at__lt=timezone.now() - stale_after())))
+    requeued = []
+    for job in stale:
+        # Conditional on the heartbeat we saw, so a live worker's next batch wins
+        still_stale = ImportJob.objects.filter(pk=job.pk, status=ImportJob.RUNNING, heartbeat_at=job.heartbeat_at)
+        if job.attempts >= MAX_ATTEMPTS:
+            if still_stale.update(status=ImportJob.FAILED, error="The import worker stopped while running this job."):
+                _finish(job)
+        elif still_stale.update(status=ImportJob.QUEUED):
+            log.warning("Requeued import job %s; its worker stopped reporting", job.pk)
+            requeued.append(job.pk)
+    return requeued
+
+
+def next_job():
+    """Claim the oldest queued job (after requeueing stale ones), or return None."""
+    reap_stale()
+    for pk in ImportJob.objects.filter(status=ImportJob.QUEUED).order_by("created_at").values_list("pk", flat=True)[:10]:
+        if claim(pk):
+            return ImportJob.objects.get(pk=pk)
+    return None
+
+
+def run(job: ImportJob):
+    """Import a claimed job's file, recording progress after every batch."""
+    progress = ImportJob.objects.filter(pk=job.pk)
+
+    def report(stats):
+        progress.update(heartbeat_at=timezone.now(), **stats)
+
+    try:
+        with job.file.open("rb") as f:
+            stats = import_rows(open_csv(f), progress=report)
+    except Exception as e:
+        log.exception("Import job %s failed", job.pk)
+        _finish(job, status=ImportJob.FAILED, error=str(e)[:1000])
+    else:
+        _finish(job, status=ImportJob.DONE, **stats)
+
+
+def _run_in_thread(pk):
+    try:
+        if claim(pk):
+            run(ImportJob.objects.get(pk=pk))
+    finally:
+        # Pool threads outlive requests; don't leak their DB connections.
+        connections.close_all()
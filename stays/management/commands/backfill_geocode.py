@@ -1,29 +1,110 @@
+from pathlib import Path
+
+from django.conf import settings
 from django.core.management.base import BaseCommand
-from time import sleep
+from django.db.models import Q
+
+from stays import gazetteer
+from stays.geocoding import (concurrency, get_provider, lookup, normalize_query, rate_limit, resolve_many,
+                             shared_limiter, to_decimal)
 from stays.models import Stay
-from stays.utils import build_query_from_stay, geocode_address
+from stays.utils import build_query_from_stay
+
+
+def checkpoint_path() -> Path:
+    return Path(getattr(settings, "STAYS_BACKFILL_CHECKPOINT", Path(settings.BASE_DIR) / "backfill_geocode.checkpoint"))
+
 
 class Command(BaseCommand):
-    help = "Backfill latitude/longitude for Stay rows missing coordinates using city/state/address."
+    help = ("Backfill latitude/longitude for Stay rows missing coordinates using city/state/address. "
+            "Distinct places are resolved once (offline gazetteer, then the geocode cache, then the "
+            "remote provider) and results are written with bulk_update.")
 
     def add_arguments(self, parser):
         parser.add_argument('--limit', type=int, default=None, help='Max rows to process')
+        parser.add_argument('--chunk', type=int, default=2000, help='Stays read, resolved and written per round')
+        parser.add_argument('--rate', type=float, default=None, help='Remote lookups per second, across all processes (default STAYS_GEOCODE_RATE)')
+        parser.add_argument('--burst', type=int, default=1, help='Remote lookups allowed back to back')
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help='Parallel remote lookups (default STAYS_GEOCODE_CONCURRENCY)')
+        parser.add_argument('--resume', action='store_true', help='Continue after the last completed chunk')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would be resolved, without remote calls or writes')
 
     def handle(self, *args, **opts):
-        qs = Stay.objects.filter(latitude__isnull=True) | Stay.objects.filter(longitude__isnull=True)
-        processed = 0
-        limit = opts.get('limit')
-        for stay in qs.iterator():
-            if limit is not None and processed >= limit:
+        qs = (Stay.objects.filter(Q(latitude__isnull=True) | Q(longitude__isnull=True))
+              .order_by('pk').only('pk', 'city', 'state', 'latitude', 'longitude'))
+        checkpoint = checkpoint_path()
+        last = 0
+        if opts['resume'] and checkpoint.exists():
+            last = int(checkpoint.read_text().strip() or 0)
+            self.stdout.write(f"Resuming after stay {last}.")
+
+        rate = opts['rate'] or rate_limit()
+        limiter = shared_limiter(rate, opts['burst'])  # shared with the web workers' geocode threads
+        workers = opts['concurrency'] or concurrency()
+        provider = get_provider()
+        limit = opts['limit']
+        dry_run = opts['dry_run']
+
+        seen, remote_keys = 0, set()
+        totals = {'offline': 0, 'cached': 0, 'remote': 0, 'updated': 0}
+        while limit is None or seen < limit:
+            size = opts['chunk'] if limit is None else min(opts['chunk'], limit - seen)
+            chunk = list(qs.filter(pk__gt=last)[:size])
+            if not chunk:
                 break
-            q = build_query_from_stay(stay)
-            if not q:
+            seen += len(chunk)
+            last = chunk[-1].pk
+
+            # Dedupe: one lookup per distinct place in the chunk
+            places = {}
+            for stay in chunk:
+                q = build_query_from_stay(stay)
+                if q:
+                    places.setdefault(q, []).append(stay)
+            coords = {}
+            for q, stays in places.items():
+                hit = gazetteer.lookup(stays[0].city, stays[0].state)
+                if hit:
+                    coords[q] = hit
+                    totals['offline'] += 1
+            pending = [q for q in places if q not in coords]
+
+            if dry_run:
+                for q in pending:
+                    if lookup(q)[0]:
+                        totals['cached'] += 1
+                    else:
+                        remote_keys.add(normalize_query(q))
                 continue
-            coords = geocode_address(q)
-            if coords:
-                stay.latitude, stay.longitude = coords
-                stay.save(update_fields=['latitude', 'longitude'])
-                self.stdout.write(self.style.SUCCESS(f"Geocoded {stay.pk}: {coords}"))
-                processed += 1
-                sleep(1.2)  # be polite to Nominatim
-        self.stdout.write(self.style.NOTICE(f"Done. Updated {processed} row(s)."))
\ No newline at end of file
+
+            resolved, asked = resolve_many(pending, provider=provider, limiter=limiter, workers=workers)
+            coords.update(resolved)
+            totals['remote'] += asked
+
+            changed = []
+            for q, stays in places.items():
+                found = coords.get(q)
+                if not found:
+                    continue
+                for stay in stays:
+                    stay.latitude, stay.longitude = to_decimal(found[0]), to_decimal(found[1])
+                    changed.append(stay)
+            if changed:
+                Stay.objects.bulk_update(changed, ['latitude', 'longitude'], batch_size=500)
+            totals['updated'] += len(changed)
+            checkpoint.write_text(str(last))
+            self.stdout.write(f"Through stay {last}: {seen} read, {totals['updated']} geocoded, "
+                              f"{totals['remote']} remote lookup(s).")
+
+        if dry_run:
+            remote = len(remote_keys)
+            self.stdout.write(self.style.NOTICE(
+                f"Dry run: {seen} stay(s) missing coordinates; places resolved offline {totals['offline']}, "
+                f"from cache {totals['cached']}, needing a remote lookup {remote} "
+                f"(~{remote / rate / 60:.1f} min at {rate:g}/s)."))
+            return
+        if limit is None or seen < limit:
+            checkpoint.unlink(missing_ok=True)  # finished; the next run starts over
+        self.stdout.write(self.style.NOTICE(f"Done. Updated {totals['updated']} row(s)."))
@@ -0,0 +1,66 @@
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+
+from stays.gazetteer import fold_name, gazetteer_path
+
+# GeoNames admin1 codes for Canadian provinces/territories (US rows already use USPS codes)
+CA_ADMIN1 = {
+    "01": "AB", "02": "BC", "03": "MB", "04": "NB", "05": "NL", "07": "NS",
+    "08": "ON", "09": "PE", "10": "QC", "11": "SK", "12": "YT", "13": "NT", "14": "NU",
+}
+
+
+class Command(BaseCommand):
+    help = "Rebuild the offline city/state gazetteer from GeoNames dumps (US.txt, CA.txt, cities500.txt, ...)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+', help='GeoNames tab-separated dump files')
+        parser.add_argument('--output', default=None, help='Defaults to the active gazetteer path')
+
+    def handle(self, *args, **opts):
+        output = opts['output'] or gazetteer_path()
+        places = {}  # key -> (population, lat, lng)
+
+        # State/province centroids are not in the dumps; carry them over
+        try:
+            with open(output, encoding='ascii') as f:
+                for line in f:
+                    key, lat, lng = line.rstrip('\n').split('\t')
+                    if key.endswith('|'):
+                        places[key] = (float('inf'), lat, lng)
+        except FileNotFoundError:
+            pass
+
+        for path in opts['files']:
+            try:
+                f = open(path, encoding='utf-8')
+            except OSError as e:
+                raise CommandError(f"Cannot read {path}: {e}")
+            with f:
+                for line in f:
+                    cols = line.rstrip('\n').split('\t')
+                    if len(cols) < 15 or cols[6] != 'P' or cols[8] not in ('US', 'CA'):
+                        continue
+                    state = cols[10] if cols[8] == 'US' else CA_ADMIN1.get(cols[10], '')
+                    if len(state) != 2:
+                        continue
+                    population = int(cols[14] or 0)
+                    lat, lng = f"{float(cols[4]):.5f}", f"{float(cols[5]):.5f}"
+                    for name in {fold_name(cols[1]), fold_name(cols[2])}:
+                        if not name:
+                            continue
+                        key = f"{state.lower()}|{name}"
+                        # Several places can share a name within a state; keep the largest
+                        if key not in places or population > places[key][0]:
+                            places[key] = (population, lat, lng)
+
+        directory = os.path.dirname(os.path.abspath(output))
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='ascii', newline='\n') as out:
+            for key in sorted(places, key=lambda k: k.encode('ascii')):
+                _, lat, lng = places[key]
+                out.write(f"{key}\t{lat}\t{lng}\n")
+        os.replace(tmp, output)  # processes that already mapped the old file keep reading it
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(places)} places to {output}"))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from stays import delta
+from stays.exporting import PARQUET_BATCH_SIZE, pa, parquet_schema, stay_rows, write_parquet, year_filtered
+from stays.models import Stay
+
+
+class Command(BaseCommand):
+    help = "Write stays to a typed Parquet file (dates as date32, money as decimal128, lat/lng as float64)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Destination .parquet file')
+        parser.add_argument('--year', default=None, help='Only stays checking in that year (YYYY)')
+        parser.add_argument('--since', default=None, metavar='TOKEN',
+                            help='Only changes (upserts and deletions) since a token from a previous delta export; '
+                                 'pass "" for a first full delta export')
+        parser.add_argument('--batch-size', type=int, default=PARQUET_BATCH_SIZE, help='Rows per record batch / row group')
+
+    def handle(self, *args, **opts):
+        if pa is None:
+            raise CommandError("Parquet export needs the pyarrow package (pip install pyarrow).")
+        if opts['since'] is not None:
+            if opts['year']:
+                raise CommandError("--year and --since cannot be combined.")
+            try:
+                since, until = delta.window(opts['since'])
+            except ValueError as e:
+                raise CommandError(str(e))
+            rows = write_parquet(delta.delta_rows(since, until), opts['output'],
+                                 parquet_schema(delta.DELTA_FIELDS), opts['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"Wrote {rows} change(s) to {opts['output']}"))
+            self.stdout.write(f"Next token: {delta.make_token(until)}")
+            return
+        qs = year_filtered(Stay.objects.all().order_by("check_in", "city"), opts['year'])
+        rows = write_parquet(stay_rows(qs), opts['output'], batch_size=opts['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {rows} stay(s) to {opts['output']}"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from stays.stats import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute the materialized chart totals (StayStat) from the stays table."
+
+    def handle(self, *args, **opts):
+        rows = rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} stat row(s)."))
@@ -0,0 +1,28 @@
+from time import sleep
+
+from django.core.management.base import BaseCommand
+
+from stays.jobs import next_job, run
+
+
+class Command(BaseCommand):
+    help = "Process queued CSV import jobs (for STAYS_IMPORT_WORKERS = 0 deployments)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds between polls of an empty queue')
+
+    def handle(self, *args, **opts):
+        while True:
+            job = next_job()
+            if job is None:
+                if opts['once']:
+                    break
+                sleep(opts['interval'])
+                continue
+            self.stdout.write(f"Importing job {job.pk} ({job.filename})...")
+            run(job)
+            job.refresh_from_db()
+            style = self.style.SUCCESS if job.status == job.DONE else self.style.ERROR
+            self.stdout.write(style(f"Job {job.pk} {job.status}: {job.processed} rows, {job.created} created, "
+                                    f"{job.updated} updated, {job.skipped} skipped. {job.error}".rstrip()))
@@ -3,15 +3,21 @@ class Migration(migrations.Migration):
     dependencies = [
         ('stays', '0010_remove_stay_latitude_remove_stay_longitude'),
     ]
+    # 0011_force_add_lat_lng, on the other branch from 0010_remove_..., adds
+    # the same columns; adding them here too made a fresh `migrate` fail with
+    # "duplicate column name: latitude". State only, so both branches agree.
+    # (Databases that already applied this migration are not affected.)
     operations = [
-        migrations.AddField(
-            model_name='stay',
-            name='latitude',
-            field=models.DecimalField(null=True, blank=True, max_digits=9, decimal_places=6),
-        ),
-        migrations.AddField(
-            model_name='stay',
-            name='longitude',
-            field=models.DecimalField(null=True, blank=True, max_digits=9, decimal_places=6),
-        ),
-    ]
\ No newline at end of file
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.AddField(
+                model_name='stay',
+                name='latitude',
+                field=models.DecimalField(null=True, blank=True, max_digits=9, decimal_places=6),
+            ),
+            migrations.AddField(
+                model_name='stay',
+                name='longitude',
+                field=models.DecimalField(null=True, blank=True, max_digits=9, decimal_places=6),
+            ),
+        ]),
+    ]
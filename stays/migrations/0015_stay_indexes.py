@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stays', '0014_alter_stay_city_alter_stay_state'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stay',
+            index=models.Index(fields=['check_in', 'id'], name='stay_checkin_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stay',
+            index=models.Index(fields=['state', 'check_in', 'id'], name='stay_state_checkin_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stay',
+            index=models.Index(fields=['city', 'check_in', 'id'], name='stay_city_checkin_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stay',
+            index=models.Index(fields=['rating', 'check_in', 'id'], name='stay_rating_checkin_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stay',
+            index=models.Index(fields=['check_in', 'city'], name='stay_checkin_city_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stay',
+            index=models.Index(condition=models.Q(('latitude__isnull', False), ('longitude__isnull', False)), fields=['latitude', 'longitude'], name='stay_geocoded_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:31
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stays', '0017_geocodecache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StayTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stay_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='stay',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='stay',
+            index=models.Index(fields=['updated_at', 'id'], name='stay_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='staytombstone',
+            index=models.Index(fields=['deleted_at', 'stay_id'], name='staytombstone_deleted_idx'),
+        ),
+    ]
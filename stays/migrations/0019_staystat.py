@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:34
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def fill_stats(apps, schema_editor):
+    # Same totals as stays.stats.rebuild(), from the historical models
+    Stay = apps.get_model('stays', 'Stay')
+    StayStat = apps.get_model('stays', 'StayStat')
+    totals = defaultdict(lambda: [0, 0, Decimal(0)])
+    rows = Stay.objects.order_by().values_list('state', 'check_in', 'rating', 'nights', 'total')
+    for state, check_in, rating, nights, total in rows.iterator():
+        for key in (('state', state or ''),
+                    ('month', check_in.strftime('%Y-%m') if check_in else ''),
+                    ('rating', '' if rating is None else str(rating))):
+            t = totals[key]
+            t[0] += 1
+            t[1] += nights or 0
+            t[2] += total or 0
+    StayStat.objects.bulk_create(
+        StayStat(kind=kind, key=key, stays=s, nights=n, spend=spend)
+        for (kind, key), (s, n, spend) in totals.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stays', '0018_stay_change_tracking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StayStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('state', 'State'), ('month', 'Month'), ('rating', 'Rating')], max_length=10)),
+                ('key', models.CharField(blank=True, max_length=50)),
+                ('stays', models.IntegerField(default=0)),
+                ('nights', models.IntegerField(default=0)),
+                ('spend', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'key'), name='staystat_kind_key_uniq')],
+            },
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
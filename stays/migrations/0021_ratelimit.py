@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stays', '0020_dataversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateLimit',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('next_at', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
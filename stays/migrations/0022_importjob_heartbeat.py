@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stays', '0021_ratelimit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,6 +1,113 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from decimal import Decimal
 
+
+class StayQuerySet(models.QuerySet):
+    # Set on the querysets Django's bulk_update() runs its UPDATEs through:
+    # those writes are accounted for (version, chart totals) by bulk_update()
+    # and its caller
+    _in_bulk_update = False
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._in_bulk_update = self._in_bulk_update
+        return clone
+
+    # Bulk writes skip auto_now and the save signals; stamp updated_at here so
+    # delta exports see them, and advance the data version (stays/versioning.py)
+    def update(self, **kwargs):
+        kwargs.setdefault("updated_at", timezone.now())
+        rows = super().update(**kwargs)
+        from .stats import STAT_FIELDS, rebuild
+        from .versioning import bump_data_version
+        if self._in_bulk_update:
+            return rows
+        if rows:
+            bump_data_version()
+        if rows and set(kwargs) & set(STAT_FIELDS):
+            rebuild()  # old values are gone; recount the chart totals
+        return rows
+
+    def bulk_update(self, objs, fields, batch_size=None, stats_handled=False):
+        """
+        Moves the chart totals (stays/stats.py) from the stored values of
+        charted fields to the new ones; a caller that already accounts for
+        them (the importer, per batch) passes stats_handled=True.
+        """
+        from .stats import STAT_FIELDS, apply_many
+        from .versioning import bump_data_version
+        objs, fields = list(objs), list(fields)
+        now = timezone.now()
+        for obj in objs:
+            obj.updated_at = now
+        if "updated_at" not in fields:
+            fields.append("updated_at")
+        charted = [] if stats_handled else [f for f in STAT_FIELDS if f in fields]
+        qs = self._chain()
+        qs._in_bulk_update = True
+        with transaction.atomic(using=self.db):
+            stored = {}
+            if charted:
+                by_pk = {obj.pk: obj for obj in objs}
+                pks = list(by_pk)
+                for i in range(0, len(pks), 500):
+                    for row in self.filter(pk__in=pks[i:i + 500]).order_by().values("pk", *STAT_FIELDS):
+                        stored[row.pop("pk")] = row
+            rows = super(StayQuerySet, qs).bulk_update(objs, fields, batch_size=batch_size)
+            if stored:
+                apply_many([(old, {**old, **{f: getattr(by_pk[pk], f) for f in charted}})
+                            for pk, old in stored.items()])
+        if objs:
+            bump_data_version()
+        return rows
+
+    def bulk_create(self, objs, *args, **kwargs):
+        from .versioning import bump_data_version
+        created = super().bulk_create(objs, *args, **kwargs)
+        if created:
+            bump_data_version()
+        return created
+
+    def in_bbox(self, bbox):
+        """Stays inside bbox (minLng, minLat, maxLng, maxLat); see stays/spatial.py."""
+        from .spatial import bbox_filter
+        return self.filter(bbox_filter(bbox, self.db))
+
+    def nearest(self, lat, lng, limit=10):
+        """
+        The `limit` geocoded stays closest to (lat, lng), nearest first, each
+        with a `distance_km` attribute. Searches growing boxes on the spatial
+        index instead of measuring every row.
+        """
+        from .spatial import box_around, haversine_km
+        qs = self.exclude(latitude__isnull=True).exclude(longitude__isnull=True)
+        radius = 0.25
+        while True:
+            found = list(qs.in_bbox(box_around(lat, lng, radius))
+                         .order_by().values_list("id", "latitude", "longitude"))
+            if len(found) >= limit or radius >= 180:
+                break
+            radius *= 4
+        ranked = sorted((haversine_km(lat, lng, float(a), float(b)), pk) for pk, a, b in found)
+        if len(ranked) >= limit:
+            # The box only guarantees the k-th hit; widen to its distance so
+            # nothing closer hiding just outside the box corners is missed.
+            reach = ranked[limit - 1][0] / 111.195
+            if reach > radius:
+                found = (qs.in_bbox(box_around(lat, lng, reach))
+                         .order_by().values_list("id", "latitude", "longitude"))
+                ranked = sorted((haversine_km(lat, lng, float(a), float(b)), pk) for pk, a, b in found)
+        ranked = ranked[:limit]
+        objs = self.in_bulk([pk for _, pk in ranked])
+        out = []
+        for dist, pk in ranked:
+            obj = objs[pk]
+            obj.distance_km = dist
+            out.append(obj)
+        return out
+
+
 class Stay(models.Model):
     # Media
     photo = models.ImageField(upload_to="stays_photos/", null=True, blank=True)
@@ -30,6 +137,11 @@ class Stay(models.Model):
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
 
+    # Change tracking for delta exports (deletions are kept as StayTombstone rows)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = StayQuerySet.as_manager()
+
     def __str__(self):
         bits = [self.park or "Stay"]
         if self.city: bits.append(self.city)
@@ -39,9 +151,25 @@ class Stay(models.Model):
 
     class Meta:
         ordering = ["-check_in"]
+        indexes = [
+            # List order / keyset pagination: (-check_in, -id)
+            models.Index(fields=["check_in", "id"], name="stay_checkin_id_idx"),
+            # List filters, each followed by the list order
+            models.Index(fields=["state", "check_in", "id"], name="stay_state_checkin_idx"),
+            models.Index(fields=["city", "check_in", "id"], name="stay_city_checkin_idx"),
+            models.Index(fields=["rating", "check_in", "id"], name="stay_rating_checkin_idx"),
+            # CSV export: ?year= range on check_in, sorted by (check_in, city)
+            models.Index(fields=["check_in", "city"], name="stay_checkin_city_idx"),
+            # Map endpoints only ever read geocoded rows
+            models.Index(fields=["latitude", "longitude"], name="stay_geocoded_idx",
+                         condition=models.Q(latitude__isnull=False, longitude__isnull=False)),
+            # Delta export: rows changed inside a watermark window
+            models.Index(fields=["updated_at", "id"], name="stay_updated_idx"),
+        ]
 
     # QoL: auto-calc nights/total if possible
-    def save(self, *args, **kwargs):
+    def fill_derived_fields(self):
+        """Derive nights from the dates and total from rate × nights + fees."""
         try:
             if self.check_in and self.leave:
                 delta = (self.leave - self.check_in).days
@@ -55,4 +183,151 @@ class Stay(models.Model):
                 self.total = (base + (self.fees or Decimal("0.00"))).quantize(Decimal("0.01"))
         except Exception:
             pass
+
+    def save(self, *args, **kwargs):
+        self.fill_derived_fields()
+        update_fields = kwargs.get("update_fields")
+        if update_fields and "updated_at" not in update_fields:
+            kwargs["update_fields"] = [*update_fields, "updated_at"]
         super().save(*args, **kwargs)
+
+
+class StayStat(models.Model):
+    """
+    Precomputed chart totals (see stays/stats.py): one row per state,
+    check-in month ("YYYY-MM") or rating, with "" for stays lacking the value.
+    """
+
+    STATE = "state"
+    MONTH = "month"
+    RATING = "rating"
+    KIND_CHOICES = [(STATE, "State"), (MONTH, "Month"), (RATING, "Rating")]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    key = models.CharField(max_length=50, blank=True)
+    stays = models.IntegerField(default=0)
+    nights = models.IntegerField(default=0)
+    spend = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["kind", "key"], name="staystat_kind_key_uniq")]
+
+    def __str__(self):
+        return f"{self.kind} {self.key or '—'}: {self.stays} stays, {self.nights} nights"
+
+
+class StayTombstone(models.Model):
+    """Marks a deleted stay so delta exports can pass the deletion on."""
+
+    stay_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=["deleted_at", "stay_id"], name="staytombstone_deleted_idx")]
+
+    def __str__(self):
+        return f"Stay {self.stay_id} deleted {self.deleted_at:%Y-%m-%d %H:%M}"
+
+
+class DataVersion(models.Model):
+    """
+    Named write counters (see stays/versioning.py). Kept in the database so
+    every process, including management commands and import workers, sees
+    the same number.
+    """
+
+    name = models.CharField(max_length=50, primary_key=True)
+    version = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.name} @ {self.version}"
+
+
+class RateLimit(models.Model):
+    """
+    Shared pacing state for a rate limit that spans processes (see
+    geocoding.SharedRateLimit): the theoretical arrival time of the next
+    call, in microseconds since the epoch.
+    """
+
+    name = models.CharField(max_length=50, primary_key=True)
+    next_at = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return self.name
+
+
+class ImportJob(models.Model):
+    """A CSV upload queued for background import (see stays/jobs.py)."""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [(QUEUED, "Queued"), (RUNNING, "Running"), (DONE, "Done"), (FAILED, "Failed")]
+
+    file = models.FileField(upload_to="imports/")
+    filename = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+
+    # Progress, updated once per batch while running
+    processed = models.PositiveIntegerField(default=0)
+    created = models.PositiveIntegerField(default=0)
+    updated = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Touched with every batch; a running job that stops touching it lost its worker
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [models.Index(fields=["status", "created_at"], name="importjob_status_idx")]
+
+    def __str__(self):
+        return f"Import {self.pk} ({self.filename or self.file.name}) — {self.status}"
+
+    @property
+    def finished(self):
+        return self.status in (self.DONE, self.FAILED)
+
+    def progress(self):
+        """JSON-friendly status for the progress endpoint."""
+        return {
+            "id": self.pk,
+            "status": self.status,
+            "filename": self.filename,
+            "processed": self.processed,
+            "created": self.created,
+            "updated": self.updated,
+            "skipped": self.skipped,
+            "error": self.error,
+            "finished": self.finished,
+        }
+
+
+class GeocodeCache(models.Model):
+    """
+    Remote geocoder answers keyed by normalized query (see stays/geocoding.py).
+    A row without coordinates records a miss and is retried after
+    STAYS_GEOCODE_NEGATIVE_TTL seconds; hits are kept indefinitely.
+    """
+
+    query = models.CharField(max_length=255, unique=True)
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    provider = models.CharField(max_length=50, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        if self.found:
+            return f"{self.query} → {self.latitude}, {self.longitude}"
+        return f"{self.query} → (not found)"
+
+    @property
+    def found(self):
+        return self.latitude is not None and self.longitude is not None
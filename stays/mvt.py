@@ -0,0 +1,108 @@
+"""
+Minimal Mapbox Vector Tile (v2) encoder for point layers.
+
+Only what the stays layer needs: one layer of Point features with string and
+integer properties. The protobuf wire format is written by hand so no
+protobuf/mapbox-vector-tile dependency is required.
+"""
+import math
+import struct
+
+EXTENT = 4096
+_MAX_LAT = 85.05112878
+
+
+def _varint(n: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _zigzag(n: int) -> int:
+    return (n << 1) ^ (n >> 63)
+
+
+def _field(number: int, wire_type: int) -> bytes:
+    return _varint((number << 3) | wire_type)
+
+
+def _bytes_field(number: int, payload: bytes) -> bytes:
+    return _field(number, 2) + _varint(len(payload)) + payload
+
+
+def _uint_field(number: int, value: int) -> bytes:
+    return _field(number, 0) + _varint(value)
+
+
+def _packed(number: int, values) -> bytes:
+    return _bytes_field(number, b"".join(_varint(v) for v in values))
+
+
+def _value(v) -> bytes:
+    if isinstance(v, bool):
+        return _uint_field(7, int(v))
+    if isinstance(v, int):
+        return _field(6, 0) + _varint(_zigzag(v)) if v < 0 else _uint_field(5, v)
+    if isinstance(v, float):
+        return _field(3, 1) + struct.pack("<d", v)
+    return _bytes_field(1, str(v).encode("utf-8"))
+
+
+def tile_bounds(z: int, x: int, y: int):
+    """(min_lng, min_lat, max_lng, max_lat) of an XYZ tile."""
+    n = 2 ** z
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return (x / n * 360.0 - 180.0, lat(y + 1), (x + 1) / n * 360.0 - 180.0, lat(y))
+
+
+def project(lat: float, lng: float, z: int, x: int, y: int):
+    """Tile-local integer coordinates (0..EXTENT) of a point."""
+    n = 2 ** z
+    lat = max(-_MAX_LAT, min(_MAX_LAT, lat))
+    s = math.sin(math.radians(lat))
+    wx = (lng + 180.0) / 360.0 * n
+    wy = (0.5 - math.log((1 + s) / (1 - s)) / (4 * math.pi)) * n
+    return round((wx - x) * EXTENT), round((wy - y) * EXTENT)
+
+
+def encode_points(layer_name, features, z, x, y):
+    """
+    Encode [(id, lat, lng, {prop: value}), ...] as a one-layer tile.
+    Returns b"" for an empty tile.
+    """
+    keys, key_index = [], {}
+    values, value_index = [], {}
+    encoded = []
+    for fid, lat, lng, props in features:
+        tags = []
+        for k, v in props.items():
+            if v is None:
+                continue
+            if k not in key_index:
+                key_index[k] = len(keys)
+                keys.append(k)
+            vkey = (type(v), v)
+            if vkey not in value_index:
+                value_index[vkey] = len(values)
+                values.append(v)
+            tags += [key_index[k], value_index[vkey]]
+        px, py = project(lat, lng, z, x, y)
+        geometry = [(1 & 0x7) | (1 << 3), _zigzag(px), _zigzag(py)]  # MoveTo(1)
+        feature = _uint_field(1, fid) + _packed(2, tags) + _uint_field(3, 1) + _packed(4, geometry)
+        encoded.append(_bytes_field(2, feature))
+    if not encoded:
+        return b""
+    layer = (_uint_field(15, 2) + _bytes_field(1, layer_name.encode("utf-8")) + b"".join(encoded)
+             + b"".join(_bytes_field(3, k.encode("utf-8")) for k in keys)
+             + b"".join(_bytes_field(4, _value(v)) for v in values)
+             + _uint_field(5, EXTENT))
+    return _bytes_field(3, layer)
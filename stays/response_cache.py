@@ -0,0 +1,199 @@
+"""
+Whole-response caching for the read-heavy stay views.
+
+@cache_response("name") stores a view's rendered response in the cache
+named by STAYS_RESPONSE_CACHE (an alias in settings.CACHES: file by
+default, or Redis). The key is the view name, the Stay data version and the normalized
+query string, so a write moves every reader on to fresh keys and nothing
+has to be deleted; STAYS_RESPONSE_CACHE_TIMEOUT only bounds how long an
+entry is trusted.
+
+Stampede protection: on a miss one request takes a short lock (cache.add)
+and renders; the others wait for its entry instead of rendering the same
+page. An entry past its timeout is kept around a while longer and served
+as-is ("stale") to everyone but the single request refreshing it. The
+lock is cache.add(), except on the file backend, whose add() checks and
+then writes: there it is a lock file created with O_EXCL next to the
+entries. With locmem both entries and lock are per process.
+
+Streaming responses are passed through as they are generated and stored
+at the end if they came to at most STAYS_RESPONSE_CACHE_MAX_BYTES; the
+lock is let go as soon as one grows past that.
+FileResponses (the pre-encoded map snapshot) and non-200 responses are
+never stored.
+"""
+import hashlib
+import os
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.http import FileResponse, HttpResponse
+
+from .versioning import get_data_version
+
+# Seconds a rendering request holds the lock; covers a crashed renderer
+LOCK_TIMEOUT = 30
+# How long waiting requests poll for the renderer's entry, and how often
+WAIT_SECONDS = 10
+POLL_INTERVAL = 0.05
+
+
+def response_cache():
+    """The configured cache, or None when response caching is switched off."""
+    alias = getattr(settings, "STAYS_RESPONSE_CACHE", "default")
+    return caches[alias] if alias else None
+
+
+def timeout() -> int:
+    return getattr(settings, "STAYS_RESPONSE_CACHE_TIMEOUT", 300)
+
+
+def max_bytes() -> int:
+    return getattr(settings, "STAYS_RESPONSE_CACHE_MAX_BYTES", 2 * 1024 * 1024)
+
+
+def normalized_query(request):
+    """The query string as sorted (name, value) pairs, blank values dropped."""
+    return sorted((name, value) for name, values in request.GET.lists() for value in values if value != "")
+
+
+def cache_key(name, request, args=(), kwargs=None):
+    raw = repr((normalized_query(request), args, sorted((kwargs or {}).items())))
+    digest = hashlib.sha1(raw.encode()).hexdigest()
+    return f"stays:response:{name}:{get_data_version()}:{digest}"
+
+
+def _lock_file(store, lock):
+    # Not a .djcache file, so culling and clear() leave it alone
+    return os.path.join(store._dir, hashlib.sha1(lock.encode()).hexdigest() + ".lock")
+
+
+def _acquire(store, lock) -> bool:
+    if not isinstance(store, FileBasedCache):
+        return store.add(lock, 1, LOCK_TIMEOUT)
+    path = _lock_file(store, lock)
+    os.makedirs(store._dir, exist_ok=True)
+    for _ in range(2):
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) <= LOCK_TIMEOUT:
+                    return False
+                os.remove(path)  # left by a crashed renderer
+            except FileNotFoundError:
+                pass
+    return False
+
+
+def _release(store, lock):
+    if not isinstance(store, FileBasedCache):
+        store.delete(lock)
+        return
+    try:
+        os.remove(_lock_file(store, lock))
+    except FileNotFoundError:
+        pass
+
+
+def _locked(store, lock) -> bool:
+    if not isinstance(store, FileBasedCache):
+        return store.get(lock) is not None
+    return os.path.exists(_lock_file(store, lock))
+
+
+def _served(response, state):
+    response["X-Cache"] = state
+    return response
+
+
+def _storable(request, response):
+    return (response.status_code == 200 and not response.cookies
+            and not request.META.get("CSRF_COOKIE_NEEDS_UPDATE"))
+
+
+def _put(store, key, response):
+    ttl = timeout()
+    # Kept for twice its timeout so the second half can be served stale
+    store.set(key, (time.time() + ttl, response), ttl * 2)
+
+
+def _stream_and_store(store, key, lock, response):
+    """Pass a streaming response through, storing it at the end if small enough."""
+    limit = max_bytes()
+    source = response.streaming_content
+
+    def chunks():
+        parts, size = [], 0
+        try:
+            for chunk in source:
+                if parts is not None:
+                    parts.append(chunk)
+                    size += len(chunk)
+                    if size > limit:
+                        parts = None
+                        _release(store, lock)  # never stored; don't keep others waiting
+                yield chunk
+            if parts is not None:
+                headers = {k: v for k, v in response.items() if k.lower() != "x-cache"}
+                _put(store, key, HttpResponse(b"".join(parts), status=response.status_code, headers=headers))
+        finally:
+            if parts is not None:
+                _release(store, lock)
+
+    response.streaming_content = chunks()
+    return response
+
+
+def _render(store, key, lock, view, request, args, kwargs):
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, "render") and callable(response.render):
+            response = response.render()
+    except BaseException:
+        _release(store, lock)
+        raise
+    if isinstance(response, FileResponse) or not _storable(request, response):
+        _release(store, lock)
+        return response
+    if response.streaming:
+        return _served(_stream_and_store(store, key, lock, response), "miss")
+    try:
+        _put(store, key, response)
+    finally:
+        _release(store, lock)
+    return _served(response, "miss")
+
+
+def cache_response(name):
+    """Cache a GET view's responses per data version and query string (see module docstring)."""
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            store = response_cache()
+            if store is None or request.method not in ("GET", "HEAD"):
+                return view(request, *args, **kwargs)
+            key = cache_key(name, request, args, kwargs)
+            lock = key + ":lock"
+            entry = store.get(key)
+            if entry and entry[0] > time.time():
+                return _served(entry[1], "hit")
+            if _acquire(store, lock):
+                return _render(store, key, lock, view, request, args, kwargs)
+            if entry:
+                return _served(entry[1], "stale")  # someone else is refreshing it
+            deadline = time.monotonic() + WAIT_SECONDS
+            while time.monotonic() < deadline:
+                time.sleep(POLL_INTERVAL)
+                entry = store.get(key)
+                if entry:
+                    return _served(entry[1], "hit")
+                if not _locked(store, lock):
+                    break  # the renderer gave up without storing (error, uncacheable)
+            return view(request, *args, **kwargs)
+        return wrapped
+    return decorator
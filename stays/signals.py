@@ -1,18 +1,65 @@
-from django.db.models.signals import pre_save
+from django.db.models.signals import pre_save, post_save, post_delete, post_migrate
+from django.db import transaction
 from django.dispatch import receiver
-from .models import Stay
-from .utils import build_query_from_stay, geocode_address
+from . import geoqueue, stats, versioning  # noqa: F401  versioning connects its receiver first
+from .facets import FACET_FIELDS, facet_values, facets
+from .models import Stay, StayTombstone
+from .spatial import install_rtree
+from .stats import STAT_FIELDS, stat_values
+from .utils import build_query_from_stay
 
-@receiver(pre_save, sender=Stay)
+@receiver(post_save, sender=Stay)
 def stays_autogeocode(sender, instance: Stay, **kwargs):
-    # Only fill if both coords are missing
+    # Only fill if both coords are missing; resolved off the request (stays/geoqueue.py)
     lat_missing = not getattr(instance, "latitude", None)
     lng_missing = not getattr(instance, "longitude", None)
-    if not (lat_missing and lng_missing):
+    if not (lat_missing and lng_missing) or not geoqueue.enabled():
+        return
+    if not build_query_from_stay(instance):
+        return
+    pk = instance.pk
+    transaction.on_commit(lambda: geoqueue.enqueue(pk))
+
+# Stored values that post_save compares against to move facet counts and chart totals
+SNAPSHOT_FIELDS = tuple(dict.fromkeys(FACET_FIELDS + STAT_FIELDS))
+
+@receiver(pre_save, sender=Stay)
+def stays_facets_snapshot(sender, instance: Stay, update_fields=None, **kwargs):
+    # Remember the stored facet/stat values so post_save can move the counts
+    instance._stored = None
+    if instance._state.adding or instance.pk is None:
         return
-    q = build_query_from_stay(instance)
-    if not q:
+    if update_fields is not None and not set(update_fields) & set(SNAPSHOT_FIELDS):
+        instance._stored = {f: getattr(instance, f, None) for f in SNAPSHOT_FIELDS}
         return
-    coords = geocode_address(q)
-    if coords:
-        instance.latitude, instance.longitude = coords
\ No newline at end of file
+    instance._stored = (Stay.objects.filter(pk=instance.pk)
+                        .values(*SNAPSHOT_FIELDS).first())
+
+@receiver(post_save, sender=Stay)
+def stays_facets_saved(sender, instance: Stay, created=False, **kwargs):
+    old = None if created else getattr(instance, "_stored", None)
+    facets.apply(old, facet_values(instance))
+
+@receiver(post_save, sender=Stay)
+def stays_stats_saved(sender, instance: Stay, created=False, **kwargs):
+    old = None if created else getattr(instance, "_stored", None)
+    stats.apply(old, stat_values(instance))
+
+@receiver(post_delete, sender=Stay)
+def stays_facets_deleted(sender, instance: Stay, **kwargs):
+    facets.apply(facet_values(instance), None)
+
+@receiver(post_delete, sender=Stay)
+def stays_stats_deleted(sender, instance: Stay, **kwargs):
+    stats.apply(stat_values(instance), None)
+
+@receiver(post_delete, sender=Stay)
+def stays_tombstone(sender, instance: Stay, **kwargs):
+    # Lets delta exports (stays/delta.py) report the deletion
+    StayTombstone.objects.create(stay_id=instance.pk)
+
+@receiver(post_migrate)
+def stays_install_rtree(sender, using="default", **kwargs):
+    # Recreate the R*Tree triggers that a table rebuild may have dropped
+    if getattr(sender, "name", None) == "stays":
+        install_rtree(using)
@@ -0,0 +1,127 @@
+"""
+Pre-encoded snapshot of the full /stays/map-data/ payload.
+
+One directory per data version holds map.json plus gzip (and, when the
+optional `brotli` package is installed, brotli) copies, written once by
+whichever request first sees a new version. Serving a snapshot, or
+answering a conditional GET for one, reads only the version counter (one
+primary-key lookup, see stays/versioning.py) and the filesystem; it never
+queries the stays table. Building a version prunes the older directories
+but the newest one; a request that still loses its directory to a prune
+reads the version again (open_snapshot).
+"""
+import gzip
+import os
+import shutil
+import tempfile
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+
+from .versioning import get_data_version
+
+try:
+    import brotli
+except Exception:  # optional
+    brotli = None
+
+SNAPSHOT_NAME = "map.json"
+# (Content-Encoding, file suffix, ETag suffix), preferred first
+ENCODINGS = [("br", ".br", "-br"), ("gzip", ".gz", "-gz")]
+
+
+def snapshot_root() -> Path:
+    return Path(getattr(settings, "STAYS_SNAPSHOT_DIR", Path(settings.BASE_DIR) / "snapshot_cache"))
+
+
+def _write(target: Path, chunks):
+    tmp = Path(tempfile.mkdtemp(dir=target.parent, prefix=".build-"))
+    try:
+        with ExitStack() as stack:
+            raw = stack.enter_context(open(tmp / SNAPSHOT_NAME, "wb"))
+            gz = stack.enter_context(gzip.open(tmp / (SNAPSHOT_NAME + ".gz"), "wb", compresslevel=9))
+            br = stack.enter_context(open(tmp / (SNAPSHOT_NAME + ".br"), "wb")) if brotli else None
+            compressor = brotli.Compressor(quality=9) if brotli else None
+            for chunk in chunks:
+                raw.write(chunk)
+                gz.write(chunk)
+                if br:
+                    br.write(compressor.process(chunk))
+            if br:
+                br.write(compressor.finish())
+        try:
+            os.rename(tmp, target)
+        except OSError:
+            pass  # another worker published this version first
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _prune(root: Path, keep: str, spare: int = 1):
+    # Spare the newest `spare` older versions too: a request that read one of
+    # them a moment ago may not have opened its file yet
+    old = [c for c in root.iterdir()
+           if c.is_dir() and c.name != keep and not c.name.startswith(".build-")]
+    old.sort(key=lambda c: int(c.name) if c.name.isdigit() else -1)
+    for child in old[:max(len(old) - spare, 0)]:
+        shutil.rmtree(child, ignore_errors=True)
+
+
+def get_snapshot(build_chunks):
+    """
+    (directory, version) of the snapshot for the current data version,
+    building it from `build_chunks()` (an iterable of bytes) if needed.
+    """
+    version = str(get_data_version())
+    root = snapshot_root()
+    target = root / version
+    if not (target / SNAPSHOT_NAME).exists():
+        root.mkdir(parents=True, exist_ok=True)
+        _write(target, build_chunks())
+        _prune(root, version)
+    return target, version
+
+
+def open_snapshot(build_chunks, request):
+    """
+    (open file, Content-Encoding or None, ETag suffix, version) of the
+    variant to serve for the current snapshot. If another worker pruned the
+    directory between reading the version and opening the file, reads the
+    (newer) version again and retries once.
+    """
+    for attempt in range(2):
+        directory, version = get_snapshot(build_chunks)
+        path, encoding, tag = pick_variant(directory, request)
+        try:
+            return open(path, "rb"), encoding, tag, version
+        except FileNotFoundError:
+            if attempt:
+                raise
+
+
+def accepted_encodings(request):
+    """Content codings the client accepts (q > 0), lowercased."""
+    accepted = set()
+    for part in request.headers.get("Accept-Encoding", "").split(","):
+        coding, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def pick_variant(directory: Path, request):
+    """(path, Content-Encoding or None, ETag suffix) to serve for this request."""
+    accepted = accepted_encodings(request)
+    for coding, suffix, tag in ENCODINGS:
+        path = directory / (SNAPSHOT_NAME + suffix)
+        if (coding in accepted or "*" in accepted) and path.exists():
+            return path, coding, tag
+    return directory / SNAPSHOT_NAME, None, ""
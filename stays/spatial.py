@@ -0,0 +1,125 @@
+"""
+R*Tree index of stay coordinates for plain SQLite (no PostGIS).
+
+`stays_stay_rtree` mirrors Stay.latitude/longitude as degenerate boxes and
+is kept in sync by triggers on stays_stay, so every write path (save,
+bulk_create, queryset.update, raw SQL) maintains it. The table and triggers
+are (re)created after every migrate: SQLite drops a table's triggers when
+Django rebuilds the table for a schema change.
+
+Other databases, or SQLite builds without the rtree module, fall back to
+range predicates on the coordinate index.
+"""
+import math
+
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.db.utils import DatabaseError
+
+from .geo import bbox_q, wrap_lng
+
+RTREE_TABLE = "stays_stay_rtree"
+STAY_TABLE = "stays_stay"
+
+_TRIGGERS = {
+    f"{RTREE_TABLE}_ai": f"""
+        CREATE TRIGGER IF NOT EXISTS {RTREE_TABLE}_ai AFTER INSERT ON {STAY_TABLE}
+        WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL
+        BEGIN
+            INSERT INTO {RTREE_TABLE} VALUES (NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);
+        END""",
+    f"{RTREE_TABLE}_au": f"""
+        CREATE TRIGGER IF NOT EXISTS {RTREE_TABLE}_au AFTER UPDATE OF id, latitude, longitude ON {STAY_TABLE}
+        BEGIN
+            DELETE FROM {RTREE_TABLE} WHERE id = OLD.id;
+            INSERT INTO {RTREE_TABLE}
+                SELECT NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude
+                WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL;
+        END""",
+    f"{RTREE_TABLE}_ad": f"""
+        CREATE TRIGGER IF NOT EXISTS {RTREE_TABLE}_ad AFTER DELETE ON {STAY_TABLE}
+        BEGIN
+            DELETE FROM {RTREE_TABLE} WHERE id = OLD.id;
+        END""",
+}
+
+_available = {}
+
+
+def install_rtree(using="default"):
+    """
+    Create the R*Tree table and its triggers if missing. When anything had to
+    be created the index is refilled from stays_stay. Returns True when the
+    index is usable on this connection.
+    """
+    connection = connections[using]
+    if connection.vendor != "sqlite":
+        return False
+    with connection.cursor() as cursor:
+        tables = set(connection.introspection.table_names(cursor))
+        if STAY_TABLE not in tables:
+            return False
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s", [STAY_TABLE])
+        existing = {row[0] for row in cursor.fetchall()}
+        missing = RTREE_TABLE not in tables or not set(_TRIGGERS) <= existing
+        if missing:
+            try:
+                cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {RTREE_TABLE} "
+                               "USING rtree(id, min_lat, max_lat, min_lng, max_lng)")
+            except DatabaseError:
+                _available[using] = False
+                return False
+            for sql in _TRIGGERS.values():
+                cursor.execute(sql)
+            cursor.execute(f"DELETE FROM {RTREE_TABLE}")
+            cursor.execute(f"INSERT INTO {RTREE_TABLE} "
+                           f"SELECT id, latitude, latitude, longitude, longitude FROM {STAY_TABLE} "
+                           "WHERE latitude IS NOT NULL AND longitude IS NOT NULL")
+    _available[using] = True
+    return True
+
+
+def rtree_available(using="default"):
+    if using not in _available:
+        connection = connections[using]
+        ok = False
+        if connection.vendor == "sqlite":
+            with connection.cursor() as cursor:
+                ok = RTREE_TABLE in connection.introspection.table_names(cursor)
+        _available[using] = ok
+    return _available[using]
+
+
+def bbox_filter(bbox, using="default"):
+    """Q selecting stays inside bbox, through the R*Tree when there is one."""
+    if not rtree_available(using):
+        return bbox_q(bbox)
+    min_lng, min_lat, max_lng, max_lat = bbox
+    # The R*Tree stores 32-bit floats rounded outward, so the exact range
+    # check is kept as well; the planner drives the lookup from the rtree ids.
+    sql = f"SELECT id FROM {RTREE_TABLE} WHERE max_lat >= %s AND min_lat <= %s AND max_lng >= %s AND min_lng <= %s"
+    if min_lng <= max_lng:
+        ids = RawSQL(sql, (min_lat, max_lat, min_lng, max_lng))
+    else:
+        ids = RawSQL(f"{sql} UNION ALL {sql}", (min_lat, max_lat, min_lng, 180.0,
+                                                min_lat, max_lat, -180.0, max_lng))
+    return Q(id__in=ids) & bbox_q(bbox)
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * 6371.0088 * math.asin(min(1.0, math.sqrt(a)))
+
+
+def box_around(lat, lng, radius_deg):
+    """bbox covering every point within radius_deg (of arc) of (lat, lng)."""
+    min_lat, max_lat = max(-90.0, lat - radius_deg), min(90.0, lat + radius_deg)
+    if min_lat <= -90.0 or max_lat >= 90.0:
+        return (-180.0, min_lat, 180.0, max_lat)
+    dlng = radius_deg / max(math.cos(math.radians(max(abs(min_lat), abs(max_lat)))), 1e-6)
+    if dlng >= 180.0:
+        return (-180.0, min_lat, 180.0, max_lat)
+    return (wrap_lng(lng - dlng), min_lat, wrap_lng(lng + dlng), max_lat)
@@ -0,0 +1,119 @@
+"""
+Materialized chart totals.
+
+StayStat keeps stays / nights / spend per state, per check-in month and per
+rating. Stay save/delete signals move a stay's contribution from its old
+row to its new one with a couple of UPDATE ... SET x = x + n statements;
+the importer applies a whole batch's changes at once, and anything else
+(queryset.update() on a charted field, raw SQL) falls back to rebuild(),
+which is also what `manage.py rebuild_stats` runs. Readers get a few dozen
+rows instead of scanning stays.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Coalesce, ExtractMonth, ExtractYear
+
+from .models import Stay, StayStat
+
+# Stay fields that feed the totals
+STAT_FIELDS = ("state", "check_in", "rating", "nights", "total")
+
+
+def stat_values(instance):
+    return {f: getattr(instance, f, None) for f in STAT_FIELDS}
+
+
+def _contributions(values):
+    """[((kind, key), (stays, nights, spend))] for one stay's stored values."""
+    if not values:
+        return []
+    check_in = values.get("check_in")
+    rating = values.get("rating")
+    amounts = (1, values.get("nights") or 0, Decimal(values.get("total") or 0))
+    return [
+        ((StayStat.STATE, values.get("state") or ""), amounts),
+        ((StayStat.MONTH, check_in.strftime("%Y-%m") if check_in else ""), amounts),
+        ((StayStat.RATING, "" if rating is None else str(rating)), amounts),
+    ]
+
+
+def _deltas(pairs):
+    deltas = defaultdict(lambda: [0, 0, Decimal(0)])
+    for old, new in pairs:
+        for sign, values in ((-1, old), (1, new)):
+            for row, amounts in _contributions(values):
+                d = deltas[row]
+                for i, amount in enumerate(amounts):
+                    d[i] += sign * amount
+    return {row: d for row, d in deltas.items() if any(d)}
+
+
+def apply_many(pairs):
+    """Apply (old values or None, new values or None) changes for many stays."""
+    deltas = _deltas(pairs)
+    if not deltas:
+        return
+    with transaction.atomic():
+        for (kind, key), (stays, nights, spend) in deltas.items():
+            changes = dict(stays=F("stays") + stays, nights=F("nights") + nights, spend=F("spend") + spend)
+            if StayStat.objects.filter(kind=kind, key=key).update(**changes):
+                continue
+            try:
+                with transaction.atomic():
+                    StayStat.objects.create(kind=kind, key=key, stays=stays, nights=nights, spend=spend)
+            except IntegrityError:  # created concurrently; add to it instead
+                StayStat.objects.filter(kind=kind, key=key).update(**changes)
+
+
+def apply(old, new):
+    apply_many([(old, new)])
+
+
+def rebuild():
+    """Recompute every StayStat row from the stays table (three GROUP BYs)."""
+    totals = dict(stays=Count("id"), n=Coalesce(Sum("nights"), Value(0)), spend=Coalesce(Sum("total"), Value(Decimal(0))))
+    rows = []
+    for r in Stay.objects.order_by().values("state").annotate(**totals):
+        rows.append(StayStat(kind=StayStat.STATE, key=r["state"] or "", stays=r["stays"], nights=r["n"], spend=r["spend"]))
+    for r in (Stay.objects.order_by().annotate(y=ExtractYear("check_in"), m=ExtractMonth("check_in"))
+              .values("y", "m").annotate(**totals)):
+        key = f"{r['y']:04d}-{r['m']:02d}" if r["y"] else ""
+        rows.append(StayStat(kind=StayStat.MONTH, key=key, stays=r["stays"], nights=r["n"], spend=r["spend"]))
+    for r in Stay.objects.order_by().values("rating").annotate(**totals):
+        key = "" if r["rating"] is None else str(r["rating"])
+        rows.append(StayStat(kind=StayStat.RATING, key=key, stays=r["stays"], nights=r["n"], spend=r["spend"]))
+    # NULL and "" group separately but share the "" row
+    merged = {}
+    for row in rows:
+        seen = merged.get((row.kind, row.key))
+        if seen:
+            seen.stays += row.stays
+            seen.nights += row.nights
+            seen.spend += row.spend
+        else:
+            merged[(row.kind, row.key)] = row
+    with transaction.atomic():
+        StayStat.objects.all().delete()
+        StayStat.objects.bulk_create(merged.values())
+    return len(merged)
+
+
+def rows(kind):
+    """[(key, stays, nights, spend)] for one kind, sorted by key, skipping emptied rows."""
+    return list(StayStat.objects.filter(kind=kind, stays__gt=0).order_by("key")
+                .values_list("key", "stays", "nights", "spend"))
+
+
+def by_year():
+    """[(year, stays, nights, spend)] rolled up from the month rows (dated stays only)."""
+    years = defaultdict(lambda: [0, 0, Decimal(0)])
+    for key, stays, nights, spend in rows(StayStat.MONTH):
+        if key:
+            y = years[key[:4]]
+            y[0] += stays
+            y[1] += nights
+            y[2] += spend
+    return [(y, *years[y]) for y in sorted(years)]
@@ -1 +1,345 @@
-# you can add tests later
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from importlib import import_module
+from pathlib import Path
+from unittest import mock
+
+from django.apps import apps as django_apps
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from stays import delta, gazetteer, geoqueue, jobs, pagination, response_cache, snapshot, stats
+from stays.facets import facets
+from stays.geocoding import SharedRateLimit
+from stays.importer import import_rows
+from stays.models import ImportJob, Stay, StayStat, StayTombstone
+from stays.versioning import get_data_version
+
+
+def stat_rows():
+    return sorted(StayStat.objects.filter(stays__gt=0).values_list("kind", "key", "stays", "nights", "spend"))
+
+
+@override_settings(STAYS_GEOCODE_ON_SAVE=False)
+class ImportStatsTests(TestCase):
+    def rows(self, rate, rating):
+        return [{"Park": f"Park {i}", "City": "Austin", "State": "TX", "Check in": f"2024-05-{i + 1:02d}",
+                 "Leave": f"2024-05-{i + 3:02d}", "Rate/nt": rate, "Rating": rating} for i in range(8)]
+
+    def test_reimport_with_changed_values_keeps_totals_exact(self):
+        import_rows(self.rows("20", "4"))
+        result = import_rows(self.rows("30", "5"))
+        self.assertEqual(result["updated"], 8)
+        incremental = stat_rows()
+        stats.rebuild()
+        self.assertEqual(incremental, stat_rows())
+        self.assertIn(("rating", "5", 8, 16, Decimal("480.00")), incremental)
+
+    def test_fill_stats_migration_matches_rebuild(self):
+        import_rows(self.rows("20", "4"))
+        Stay.objects.create(park="No dates")
+        fill_stats = import_module("stays.migrations.0019_staystat").fill_stats
+        StayStat.objects.all().delete()
+        fill_stats(django_apps, None)
+        filled = stat_rows()
+        stats.rebuild()
+        self.assertEqual(filled, stat_rows())
+
+    def test_bulk_update_of_charted_fields_moves_totals(self):
+        import_rows(self.rows("20", "4"))
+        stays = list(Stay.objects.order_by("pk")[:3])
+        for stay in stays:
+            stay.nights, stay.state, stay.rating = 9, "OK", 2
+        Stay.objects.bulk_update(stays, ["nights", "state", "rating"], batch_size=2)
+        incremental = stat_rows()
+        stats.rebuild()
+        self.assertEqual(incremental, stat_rows())
+        self.assertIn(("state", "OK", 3, 27, Decimal("120.00")), incremental)
+
+    @override_settings(STAYS_GEOCODE_ON_SAVE=True)
+    def test_rows_without_coordinates_are_queued_for_geocoding(self):
+        rows = self.rows("20", "4")
+        rows[0].update({"Lat": "30.27", "Lng": "-97.74"})
+        with mock.patch.object(geoqueue, "enqueue") as enqueue:
+            with self.captureOnCommitCallbacks(execute=True):
+                import_rows(rows)
+        queued = set(enqueue.call_args.args)
+        self.assertEqual(queued, set(Stay.objects.filter(latitude__isnull=True).values_list("pk", flat=True)))
+        self.assertEqual(len(queued), 7)
+
+    def test_non_finite_numbers_skip_the_row(self):
+        rows = self.rows("20", "4")
+        rows[0]["Rate/nt"] = "NaN"
+        rows[1]["Rating"] = "inf"
+        rows[2]["Rate/nt"] = "123456789012"
+        rows[3]["Rating"] = "1e30"
+        rows[4]["Nights"] = "99999999999999999999"
+        rows[5].update({"Leave": "", "Nights": "1000000000", "Rate/nt": "999999"})
+        result = import_rows(rows)
+        self.assertEqual((result["created"], result["skipped"]), (2, 6))
+        self.assertEqual(Stay.objects.count(), 2)
+
+
+@override_settings(STAYS_GEOCODE_ON_SAVE=False)
+class DataVersionTests(TestCase):
+    def test_each_write_bumps_once_and_facets_stay_incremental(self):
+        stay = Stay.objects.create(park="A", city="Austin", state="TX", rating=4)
+        self.assertEqual(facets.counts("state"), [("TX", 1)])
+        version = get_data_version()
+        stay.state = "OK"
+        stay.save()
+        self.assertEqual(get_data_version(), version + 1)
+        self.assertEqual(facets._version, version + 1)  # moved, not reloaded
+        self.assertEqual(facets.counts("state"), [("OK", 1)])
+        stay.nights = 3
+        Stay.objects.bulk_update([stay], ["nights"])
+        self.assertEqual(get_data_version(), version + 2)
+        stay.delete()
+        self.assertEqual(get_data_version(), version + 3)
+        self.assertEqual(facets.counts("state"), [])
+
+
+@override_settings(STAYS_GEOCODE_ON_SAVE=False)
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        # Duplicate check-in dates and an undated section, ids interleaved
+        days = [date(2024, 5, 1), None, date(2024, 5, 3), date(2024, 5, 1), None,
+                date(2023, 1, 9), date(2024, 5, 3), None, date(2024, 5, 1)]
+        for i in range(23):
+            Stay.objects.create(park=f"P{i}", state="TX" if i % 3 else "OK", check_in=days[i % len(days)])
+
+    def expected(self, qs):
+        dated = sorted(qs.exclude(check_in__isnull=True), key=lambda s: (s.check_in, s.pk), reverse=True)
+        undated = sorted(qs.filter(check_in__isnull=True), key=lambda s: s.pk, reverse=True)
+        return [s.pk for s in dated + undated]
+
+    def walk(self, qs, size):
+        pages, page = [], pagination.keyset_page(qs, page_size=size)
+        while True:
+            pages.append([s.pk for s in page["object_list"]])
+            if not page["next_token"]:
+                break
+            page = pagination.keyset_page(qs, after=page["next_token"], page_size=size)
+        forward = [pk for p in pages for pk in p]
+        backward = [pages[-1]]
+        while page["prev_token"]:
+            page = pagination.keyset_page(qs, before=page["prev_token"], page_size=size)
+            backward.insert(0, [s.pk for s in page["object_list"]])
+        return pages, forward, backward
+
+    def test_pages_cover_every_row_once_both_ways(self):
+        for qs in (Stay.objects.all(), Stay.objects.filter(state="TX")):
+            for size in (1, 4, 7, 50):
+                pages, forward, backward = self.walk(qs, size)
+                self.assertEqual(forward, self.expected(qs), size)
+                self.assertEqual(backward, pages, size)
+                self.assertTrue(all(len(p) == size for p in pages[:-1]))
+
+    def test_first_page_has_no_prev_and_last_page_no_next(self):
+        pages, _, _ = self.walk(Stay.objects.all(), 5)
+        first = pagination.keyset_page(Stay.objects.all(), page_size=5)
+        self.assertIsNone(first["prev_token"])
+        self.assertEqual(len(pages), 5)
+
+    def test_tampered_tokens_fall_back_to_the_first_page(self):
+        first = [s.pk for s in pagination.keyset_page(Stay.objects.all(), page_size=4)["object_list"]]
+        bad = ["garbage", "W1td", pagination.encode_cursor(None, 1)[:-2] + "!!", "WyIyMDI0LTEzLTAxIiwxXQ"]
+        for token in bad:
+            self.assertIsNone(pagination.decode_cursor(token), token)
+            page = pagination.keyset_page(Stay.objects.all(), after=token, before=token, page_size=4)
+            self.assertEqual([s.pk for s in page["object_list"]], first)
+        self.assertEqual(pagination.parse_page_size("0"), 1)
+        self.assertEqual(pagination.parse_page_size("5000"), pagination.MAX_PAGE_SIZE)
+        self.assertEqual(pagination.parse_page_size("x"), pagination.DEFAULT_PAGE_SIZE)
+
+
+class ChartDataTests(TestCase):
+    def test_out_of_range_year_is_a_bad_request(self):
+        for year in ("0", "-5", "9999", "abc"):
+            response = self.client.get("/stays/charts/data/", {"year": year})
+            self.assertEqual(response.status_code, 400, year)
+        response = self.client.get("/stays/charts/data/", {"year": "9998", "by": "time"})
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(STAYS_GEOCODE_ON_SAVE=False, STAYS_RESPONSE_CACHE="responses")
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        caches = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+                  "responses": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                                "LOCATION": tmp.name}}
+        settings = override_settings(CACHES=caches)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.calls = 0
+
+        @response_cache.cache_response("test")
+        def view(request):
+            self.calls += 1
+            return HttpResponse(f"render {self.calls}")
+        self.view = view
+
+    def get(self, query=None):
+        return self.view(RequestFactory().get("/x/", query or {}))
+
+    def test_hit_miss_and_version_bump(self):
+        self.assertEqual(self.get({"a": "1", "b": ""})["X-Cache"], "miss")
+        response = self.get({"a": "1"})  # blank values don't make a new key
+        self.assertEqual((response["X-Cache"], response.content), ("hit", b"render 1"))
+        self.assertEqual(self.get({"a": "2"})["X-Cache"], "miss")
+        Stay.objects.create(park="P")
+        response = self.get({"a": "1"})
+        self.assertEqual((response["X-Cache"], response.content), ("miss", b"render 3"))
+
+    def test_expired_entry_is_served_stale_while_another_request_refreshes(self):
+        request = RequestFactory().get("/x/")
+        key = response_cache.cache_key("test", request)
+        store = response_cache.response_cache()
+        store.set(key, (0, HttpResponse("old")), 60)
+        self.assertTrue(response_cache._acquire(store, key + ":lock"))
+        response = self.view(request)
+        self.assertEqual((response["X-Cache"], response.content, self.calls), ("stale", b"old", 0))
+        response_cache._release(store, key + ":lock")
+        self.assertEqual(self.view(request).content, b"render 1")
+
+    def test_file_lock_is_exclusive_until_released_or_expired(self):
+        store = response_cache.response_cache()
+        self.assertTrue(response_cache._acquire(store, "k:lock"))
+        self.assertFalse(response_cache._acquire(store, "k:lock"))
+        response_cache._release(store, "k:lock")
+        self.assertTrue(response_cache._acquire(store, "k:lock"))
+        old = time.time() - response_cache.LOCK_TIMEOUT - 1
+        os.utime(response_cache._lock_file(store, "k:lock"), (old, old))
+        self.assertTrue(response_cache._acquire(store, "k:lock"))  # crashed holder
+
+    @override_settings(STAYS_RESPONSE_CACHE_MAX_BYTES=10)
+    def test_oversized_stream_lets_go_of_the_lock_and_is_not_stored(self):
+        @response_cache.cache_response("stream")
+        def view(request):
+            return StreamingHttpResponse(b"x" * 8 for _ in range(4))
+        request = RequestFactory().get("/x/")
+        lock = response_cache.cache_key("stream", request) + ":lock"
+        store = response_cache.response_cache()
+        chunks = iter(view(request).streaming_content)
+        next(chunks)
+        self.assertTrue(response_cache._locked(store, lock))
+        next(chunks)  # 16 bytes: over the limit
+        self.assertFalse(response_cache._locked(store, lock))
+        self.assertEqual(len(b"".join(chunks)), 16)
+        self.assertEqual(view(request)["X-Cache"], "miss")
+
+
+@override_settings(STAYS_GEOCODE_ON_SAVE=False)
+class DeltaTests(TestCase):
+    @override_settings(SQLITE_PRAGMAS={"busy_timeout": 5000}, STAYS_DELTA_SAFETY_SECONDS=2)
+    def test_window_trails_the_clock_by_busy_timeout_plus_margin(self):
+        before = timezone.now()
+        since, until = delta.window()
+        after = timezone.now()
+        self.assertIsNone(since)
+        self.assertTrue(before - timedelta(seconds=7) <= until <= after - timedelta(seconds=7))
+        # Asked again within the lag: an empty window, not one reaching back
+        later = timezone.now() - timedelta(seconds=1)
+        self.assertEqual(delta.window(delta.make_token(later)), (later, later))
+
+    def test_tokens_round_trip_and_reject_garbage(self):
+        stamp = timezone.now()
+        self.assertEqual(delta.parse_token(delta.make_token(stamp)), stamp)
+        for token in ("nope", delta.make_token(stamp.replace(tzinfo=None))):
+            with self.assertRaises(ValueError):
+                delta.parse_token(token)
+
+    def test_window_is_open_below_and_closed_above(self):
+        t0 = timezone.now() - timedelta(hours=1)
+        stays = [Stay.objects.create(park=f"P{i}") for i in range(4)]
+        for i, stay in enumerate(stays):
+            Stay.objects.filter(pk=stay.pk).update(updated_at=t0 + timedelta(minutes=i))
+        gone = stays[3].pk
+        stays[3].delete()
+        StayTombstone.objects.filter(stay_id=gone).update(deleted_at=t0 + timedelta(minutes=2))
+        rows = list(delta.delta_rows(t0, t0 + timedelta(minutes=2)))
+        self.assertEqual([(r[0], r[2]) for r in rows],
+                         [(delta.DELETE, gone), (delta.UPSERT, stays[1].pk), (delta.UPSERT, stays[2].pk)])
+        snapshot = list(delta.delta_rows(None, t0 + timedelta(minutes=2)))
+        self.assertEqual([r[2] for r in snapshot], [s.pk for s in stays[:3]])
+
+
+@override_settings(STAYS_GEOCODE_ON_SAVE=False)
+class MapSnapshotTests(TestCase):
+    def test_snapshot_revalidation_reads_only_the_version(self):
+        with self.settings(STAYS_SNAPSHOT_DIR=tempfile.mkdtemp()):
+            Stay.objects.create(park="P", state="TX", latitude=Decimal("30.1"), longitude=Decimal("-97.7"))
+            etag = self.client.get("/stays/map-data/")["ETag"]
+            with self.assertNumQueries(1):
+                response = self.client.get("/stays/map-data/", HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+
+    def test_pruning_spares_the_previous_version(self):
+        root = Path(tempfile.mkdtemp())
+        for name in ("7", "9", "10", "11", ".build-x"):
+            (root / name).mkdir()
+        snapshot._prune(root, "11")
+        self.assertEqual(sorted(c.name for c in root.iterdir()), [".build-x", "10", "11"])
+
+    def test_directory_pruned_before_open_is_retried(self):
+        with self.settings(STAYS_SNAPSHOT_DIR=tempfile.mkdtemp()):
+            Stay.objects.create(park="P", state="TX", latitude=Decimal("30.1"), longitude=Decimal("-97.7"))
+            fresh = snapshot.get_snapshot(lambda: [b"{}"])
+            gone = (snapshot.snapshot_root() / "1", "1")  # read, then pruned by another worker
+            with mock.patch.object(snapshot, "get_snapshot", side_effect=[gone, fresh]):
+                response = self.client.get("/stays/map-data/")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(b"".join(response.streaming_content), b"{}")
+
+
+class SharedRateLimitTests(TestCase):
+    def test_limiters_with_the_same_name_share_one_budget(self):
+        # Two instances stand in for two processes
+        web, backfill = SharedRateLimit("test", rate=2), SharedRateLimit("test", rate=2)
+        now = 1_000_000_000
+        self.assertEqual(web._reserve(now), now + 500_000)
+        self.assertEqual(backfill._reserve(now), now + 1_000_000)
+        self.assertEqual(web._reserve(now + 5_000_000), now + 5_500_000)  # idle time is not banked
+
+
+@override_settings(STAYS_GEOCODE_ON_SAVE=False, STAYS_IMPORT_WORKERS=0, MEDIA_ROOT=tempfile.mkdtemp())
+class ImportJobTests(TestCase):
+    def upload(self):
+        return SimpleUploadedFile("stays.csv", b"Park,City,State\nA,Austin,TX\n")
+
+    def test_job_left_running_by_a_dead_worker_is_requeued_and_finished(self):
+        job = jobs.enqueue(self.upload())
+        self.assertTrue(jobs.claim(job.pk))
+        ImportJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        claimed = jobs.next_job()
+        self.assertEqual(claimed.pk, job.pk)
+        path = claimed.file.path
+        jobs.run(claimed)
+        claimed.refresh_from_db()
+        self.assertEqual((claimed.status, claimed.created, claimed.attempts), (ImportJob.DONE, 1, 2))
+        self.assertFalse(claimed.file)
+        self.assertFalse(os.path.exists(path))
+
+    def test_job_is_failed_after_max_attempts(self):
+        job = jobs.enqueue(self.upload())
+        ImportJob.objects.filter(pk=job.pk).update(status=ImportJob.RUNNING, attempts=jobs.MAX_ATTEMPTS,
+                                                   heartbeat_at=timezone.now() - timedelta(hours=1))
+        self.assertIsNone(jobs.next_job())
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.FAILED)
+
+
+class GazetteerTests(TestCase):
+    def test_bundled_gazetteer_resolves_cities(self):
+        lat, lng = gazetteer.lookup("Austin", "Texas")
+        self.assertAlmostEqual(lat, 30.27, places=1)
+        self.assertAlmostEqual(lng, -97.74, places=1)
+        self.assertIsNotNone(gazetteer.lookup("Tofino", "BC"))
+        self.assertIsNotNone(gazetteer.lookup("", "MT"))
@@ -0,0 +1,74 @@
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+
+from .models import Stay
+from .mvt import EXTENT, encode_points, tile_bounds
+from .versioning import get_data_version
+
+LAYER_NAME = "stays"
+MAX_TILE_ZOOM = 18
+# Points this close (in tile units) outside the tile are included too, so
+# markers straddling a tile edge are drawn by both neighbours.
+BUFFER = 64
+
+_pruned_for = set()
+
+
+def cache_dir() -> Path:
+    return Path(getattr(settings, "STAYS_TILE_CACHE_DIR", Path(settings.BASE_DIR) / "tile_cache"))
+
+
+def _prune(root: Path, keep: str):
+    # Drop tile sets of older data versions, once per version per process.
+    if keep in _pruned_for or not root.exists():
+        return
+    _pruned_for.add(keep)
+    for child in root.iterdir():
+        if child.is_dir() and child.name != keep:
+            shutil.rmtree(child, ignore_errors=True)
+
+
+def build_tile(z: int, x: int, y: int) -> bytes:
+    min_lng, min_lat, max_lng, max_lat = tile_bounds(z, x, y)
+    pad_lng = (max_lng - min_lng) * BUFFER / EXTENT
+    pad_lat = (max_lat - min_lat) * BUFFER / EXTENT
+    bbox = (max(-180.0, min_lng - pad_lng), max(-90.0, min_lat - pad_lat),
+            min(180.0, max_lng + pad_lng), min(90.0, max_lat + pad_lat))
+    rows = (Stay.objects.exclude(latitude__isnull=True).exclude(longitude__isnull=True)
+            .in_bbox(bbox).order_by()
+            .values_list("id", "latitude", "longitude", "park", "city", "state", "nights"))
+    features = [
+        (pk, float(lat), float(lng), {"park": park or "", "city": city or "", "state": state or "", "nights": nights or 0})
+        for pk, lat, lng, park, city, state, nights in rows
+    ]
+    return encode_points(LAYER_NAME, features, z, x, y)
+
+
+def get_tile(z: int, x: int, y: int):
+    """
+    (tile bytes, data version) served from the on-disk cache, building and
+    storing the tile on a miss. Cached tiles live under <version>/z/x/y.mvt,
+    so a Stay write simply moves readers on to a fresh directory.
+    """
+    version = str(get_data_version())
+    root = cache_dir()
+    path = root / version / str(z) / str(x) / f"{y}.mvt"
+    try:
+        return path.read_bytes(), version
+    except FileNotFoundError:
+        pass
+    data = build_tile(z, x, y)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        _prune(root, version)
+    except OSError:
+        pass  # cache is best-effort; the tile itself is still good
+    return data, version
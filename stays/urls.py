@@ -10,11 +10,15 @@ urlpatterns = [
     path('<int:pk>/edit/', views.stay_edit, name='edit'),
     path('charts/', views.stay_charts, name='charts'),
     path('import/', views.import_view, name='import'),
+    path('import/<int:pk>/', views.import_job, name='import_job'),
+    path('import/<int:pk>/status/', views.import_job_status, name='import_job_status'),
     path('export/', views.export_view, name='export'),
     path('map/', views.map_page, name='map'),       # new route for the map page
     path('map-data/', views.stays_map_data, name='map_data'),
     path('export/', views.export_home, name='stays_export'),
     path('export/csv/', views.export_stays_csv, name='stays_export_csv'),
+    path('export/parquet/', views.export_stays_parquet, name='stays_export_parquet'),
+    path('export/changes/', views.export_changes, name='stays_export_changes'),
     path('export/', views.export_home, name='stays_export'),
     path('export/csv/', views.export_stays_csv, name='stays_export_csv'),
     path('charts/', views.charts_page, name='stays_charts'),
@@ -22,6 +26,7 @@ urlpatterns = [
     path('import/', views.import_stays, name='stays_import'),
     path('map/', views.map_page, name='stays_map'),
     path('map/data/', views.stays_map_data, name='stays_map_data'),
+    path('tiles/<int:z>/<int:x>/<int:y>.mvt', views.stay_tile, name='stays_tile'),
     path('appearance/', views.appearance_page, name='stays_appearance'),
 ]
 
@@ -1,5 +1,4 @@
 from typing import Optional, Tuple
-from django.conf import settings
 
 def build_query_from_stay(stay) -> Optional[str]:
     parts = []
@@ -13,17 +12,20 @@ def build_query_from_stay(stay) -> Optional[str]:
     return ", ".join(parts)
 
 def geocode_address(query: str) -> Optional[Tuple[float, float]]:
-    # Lazy import to avoid hard dep if command isn't used
-    try:
-        from geopy.geocoders import Nominatim
-    except Exception:
-        return None
-    user_agent = getattr(settings, "GEOCODER_USER_AGENT", "traveler-app")
-    geolocator = Nominatim(user_agent=user_agent, timeout=10)
-    try:
-        loc = geolocator.geocode(query)
-    except Exception:
-        return None
-    if not loc:
-        return None
-    return (loc.latitude, loc.longitude)
\ No newline at end of file
+    # Cached in GeocodeCache; only misses reach Nominatim (see stays/geocoding.py)
+    from .geocoding import geocode
+    return geocode(query)
+
+def geocode_city_state(city, state) -> Tuple[Optional[float], Optional[float]]:
+    """
+    (lat, lng) of a "City, ST" place, or (None, None). Answered from the
+    offline gazetteer when listed; otherwise falls back to the remote geocoder.
+    """
+    from .gazetteer import lookup
+    coords = lookup(city, state)
+    if coords:
+        return coords
+    query = ", ".join(str(p) for p in (city, state) if p)
+    if not query:
+        return (None, None)
+    return geocode_address(query) or (None, None)
@@ -1,23 +1,35 @@
 from .models import Stay
 from django.shortcuts import redirect
-from django.db.models import Sum, Count
+from django.db.models import Min, Max
 from .forms import StayImportForm
 
 from django.http import HttpResponse
 from django.utils import timezone
 from .models import Stay
-import csv
 import json
-from io import TextIOWrapper
+import os
 from urllib.parse import urlencode
 from datetime import datetime
 
 from django.shortcuts import render, get_object_or_404, redirect
-from django.db.models.functions import ExtractYear
-from django.http import JsonResponse, HttpResponse
+from django.http import FileResponse, JsonResponse, HttpResponse, Http404, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
 from django.contrib import messages
 
-from stays.models import Stay
+from stays.models import ImportJob, Stay, StayStat
+from stays.clustering import CLUSTER_MAX_ZOOM, cluster_index
+from stays.conditional import conditional, conditional_stay
+from stays import charts, delta, stats
+from stays.exporting import (FETCH_SIZE, csv_response, pa, parquet_chunks, parquet_schema, stay_rows,
+                             stream_response, year_filtered)
+from stays.facets import facets
+from stays.jobs import enqueue, requeue_stale
+from stays.geo import parse_bbox, parse_zoom, zoom_precision
+from stays.pagination import keyset_page, parse_page_size
+from stays.response_cache import cache_response
+from stays.snapshot import open_snapshot
+from stays.tiles import MAX_TILE_ZOOM, get_tile
 
 # Try to use your app's form; fallback to a simple ModelForm
 try:
@@ -55,14 +67,13 @@ def _apply_stay_filters(qs, request):
 
     return qs
 
+@conditional("stay_list")
+@cache_response("stay_list")
 def stay_list(request):
     qs = Stay.objects.all()
-    state_choices = list(Stay.objects.values_list("state", flat=True)
-                         .exclude(state__isnull=True).exclude(state__exact="")
-                         .distinct().order_by("state"))
-    city_choices  = list(Stay.objects.values_list("city", flat=True)
-                         .exclude(city__isnull=True).exclude(city__exact="")
-                         .distinct().order_by("city"))
+    # Filter choices come from the in-memory facet cache (see stays/facets.py)
+    state_choices = facets.choices("state")
+    city_choices  = facets.choices("city")
     rating_choices = [1, 2, 3, 4, 5]
 
     qs = _apply_stay_filters(qs, request)
@@ -78,11 +89,26 @@ def stay_list(request):
     for r in selected_ratings: qs_params.append(("rating", r))
     map_query = urlencode(qs_params)
 
+    # Keyset pagination: next/prev tokens carry the filters along with them
+    page_size = parse_page_size(request.GET.get("page_size"))
+    page = keyset_page(qs, after=request.GET.get("after"), before=request.GET.get("before"),
+                       page_size=page_size)
+    if request.GET.get("page_size"):
+        qs_params.append(("page_size", page_size))
+    next_query = urlencode(qs_params + [("after", page["next_token"])]) if page["next_token"] else ""
+    prev_query = urlencode(qs_params + [("before", page["prev_token"])]) if page["prev_token"] else ""
+
     return render(request, "stays/stay_list.html", {
-        "stays": qs,
+        "stays": page["object_list"],
+        "page_size": page_size,
+        "next_query": next_query,
+        "prev_query": prev_query,
         "state_choices": state_choices,
         "city_choices": city_choices,
         "rating_choices": rating_choices,
+        "state_counts": facets.counts("state"),
+        "city_counts": facets.counts("city"),
+        "rating_counts": facets.counts("rating"),
         "selected_states": selected_states,
         "selected_cities": selected_cities,
         "selected_ratings": selected_ratings,
@@ -112,53 +138,162 @@ def stay_map(request):
 def stays_map_data(request):
     """
     Returns GeoJSON FeatureCollection of stays with coordinates.
-    Accepts latitude/longitude or lat/lng or lat/lon field names.
+    Without query parameters it is served from a pre-encoded snapshot
+    (stays/snapshot.py) and honours If-None-Match / If-Modified-Since.
+
+    Optional: ?bbox=minLng,minLat,maxLng,maxLat limits the features to the
+    visible map area (filtered in the database on the coordinate index) and
+    ?zoom=N rounds coordinates to what is distinguishable at that zoom.
+    With ?cluster=1 (and zoom) nearby stays are merged into grid clusters.
+    ?near=lat,lng[&limit=N] returns the N closest stays instead, nearest first.
     """
-    def get_coord(obj):
-        lat = getattr(obj, "latitude", None)
-        lng = getattr(obj, "longitude", None)
-        if lat is None:
-            lat = getattr(obj, "lat", None)
-        if lng is None:
-            lng = getattr(obj, "lng", None)
-        if lng is None:
-            lng = getattr(obj, "lon", None)
-        try:
-            lat = float(lat) if lat is not None else None
-        except Exception:
-            lat = None
-        try:
-            lng = float(lng) if lng is not None else None
-        except Exception:
-            lng = None
-        return lat, lng
+    if not request.GET:
+        return _map_data_snapshot(request)  # has its own validators; skips the decorators below
+    return _map_data_query(request)
+
+@conditional("stays_map_data")
+@cache_response("stays_map_data")
+def _map_data_query(request):
+    try:
+        bbox = parse_bbox(request.GET.get("bbox"))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    zoom = parse_zoom(request.GET.get("zoom"))
+    ndigits = zoom_precision(zoom)
+    if request.GET.get("near"):
+        return _nearest_map_data(request, ndigits)
+    if request.GET.get("cluster") and zoom is not None and zoom <= CLUSTER_MAX_ZOOM:
+        return _clustered_map_data(zoom, bbox, ndigits)
+
+    qs = (Stay.objects.exclude(latitude__isnull=True).exclude(longitude__isnull=True)
+          .order_by())
+    if bbox:
+        qs = qs.in_bbox(bbox)
+
+    rows = qs.values_list("id", "park", "city", "state", "nights", "latitude", "longitude")
+    return StreamingHttpResponse(_geojson_stream(rows, ndigits), content_type="application/json")
+
+def _map_data_snapshot(request):
+    """
+    The unfiltered FeatureCollection, served from the pre-encoded snapshot
+    for the current data version with a strong ETag per encoding.
+    """
+    def build():
+        qs = (Stay.objects.exclude(latitude__isnull=True).exclude(longitude__isnull=True)
+              .order_by().values_list("id", "park", "city", "state", "nights", "latitude", "longitude"))
+        return _geojson_stream(qs, zoom_precision(None))
+
+    file, encoding, tag, version = open_snapshot(build, request)
+    etag = f'"map-{version}{tag}"'
+    last_modified = int(os.fstat(file.fileno()).st_mtime)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = FileResponse(file, content_type="application/json")
+        del response["Content-Disposition"]
+    else:
+        file.close()
+        if encoding:
+            response["Content-Encoding"] = encoding
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    response["Cache-Control"] = "no-cache"
+    patch_vary_headers(response, ["Accept-Encoding"])
+    return response
+
+MAP_DATA_CHUNK = 2000
+
+def _geojson_stream(rows, ndigits):
+    """
+    Yield a FeatureCollection piece by piece from a values_list queryset, so
+    neither the rows nor the JSON text are ever held in memory all at once.
+    """
+    dumps = json.JSONEncoder(separators=(",", ":")).encode
+    yield b'{"type":"FeatureCollection","features":['
+    buf, first = [], True
+    for pk, park, city, state, nights, lat, lng in rows.iterator(chunk_size=MAP_DATA_CHUNK):
+        buf.append(dumps({
+            "type": "Feature",
+            "properties": {"park": park or "", "city": city or "", "state": state or "",
+                           "nights": nights or 0, "id": pk},
+            "geometry": {"type": "Point", "coordinates": [round(float(lng), ndigits), round(float(lat), ndigits)]},
+        }))
+        if len(buf) >= MAP_DATA_CHUNK:
+            yield (("" if first else ",") + ",".join(buf)).encode("utf-8")
+            buf, first = [], False
+    if buf:
+        yield (("" if first else ",") + ",".join(buf)).encode("utf-8")
+    yield b"]}"
+
+def _nearest_map_data(request, ndigits):
+    """GeoJSON for ?near=lat,lng: the closest stays with their distance."""
+    try:
+        lat, lng = (float(v) for v in request.GET["near"].split(","))
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            raise ValueError
+    except ValueError:
+        return JsonResponse({"error": "near must be lat,lng"}, status=400)
+    limit = parse_page_size(request.GET.get("limit"), default=10)
+    features = []
+    for s in Stay.objects.nearest(lat, lng, limit=limit):
+        features.append({
+            "type": "Feature",
+            "properties": {"park": s.park or "", "city": s.city or "", "state": s.state or "",
+                           "nights": s.nights or 0, "id": s.id, "distance_km": round(s.distance_km, 3)},
+            "geometry": {"type": "Point", "coordinates": [round(float(s.longitude), ndigits),
+                                                          round(float(s.latitude), ndigits)]},
+        })
+    return JsonResponse({"type": "FeatureCollection", "features": features})
 
+def _clustered_map_data(zoom, bbox, ndigits):
+    """GeoJSON for ?cluster=1: one feature per grid cluster, plain stays for singletons."""
+    clusters = cluster_index.clusters(zoom, bbox)
+    singles = {c["id"] for c in clusters if c["id"] is not None}
+    props_by_id = {}
+    if singles:
+        for pk, park, city, state, nights in (Stay.objects.filter(id__in=singles).order_by()
+                                              .values_list("id", "park", "city", "state", "nights")):
+            props_by_id[pk] = {"park": park or "", "city": city or "", "state": state or "",
+                               "nights": nights or 0, "id": pk}
     features = []
-    for s in Stay.objects.all():
-        lat, lng = get_coord(s)
-        if lat is None or lng is None:
-            continue
-        props = {
-            "park": getattr(s, "park", "") or "",
-            "city": getattr(s, "city", "") or "",
-            "state": getattr(s, "state", "") or "",
-            "nights": getattr(s, "nights", 0) or 0,
-            "id": s.id,
-        }
+    for c in clusters:
+        if c["id"] is not None:
+            props = props_by_id.get(c["id"])
+            if props is None:
+                continue
+        else:
+            props = {"cluster": True, "point_count": c["count"], "expansion_zoom": c["expansion_zoom"]}
         features.append({
             "type": "Feature",
             "properties": props,
-            "geometry": {"type": "Point", "coordinates": [lng, lat]},
+            "geometry": {"type": "Point", "coordinates": [round(c["lng"], ndigits), round(c["lat"], ndigits)]},
         })
     return JsonResponse({"type": "FeatureCollection", "features": features})
 
+def stay_tile(request, z, x, y):
+    """Stay points as a Mapbox Vector Tile (layer "stays"), cached on disk per data version."""
+    if not (0 <= z <= MAX_TILE_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise Http404("No such tile")
+    data, version = get_tile(z, x, y)
+    response = HttpResponse(data, content_type="application/vnd.mapbox-vector-tile")
+    response["X-Data-Version"] = version
+    return response
+
 def map_page(request):
     """Render the standalone map page with Leaflet.
 
-    This page loads map data from the `/stays/map-data/` endpoint via JavaScript.
+    This page loads map data from the `/stays/map-data/` endpoint via JavaScript,
+    one viewport at a time; `extent` is the initial view to fit.
     """
-    return render(request, 'stays/map.html')
-
+    ext = (Stay.objects.exclude(latitude__isnull=True).exclude(longitude__isnull=True)
+           .aggregate(min_lat=Min("latitude"), min_lng=Min("longitude"),
+                      max_lat=Max("latitude"), max_lng=Max("longitude")))
+    extent = None
+    if ext["min_lat"] is not None:
+        extent = [[float(ext["min_lat"]), float(ext["min_lng"])],
+                  [float(ext["max_lat"]), float(ext["max_lng"])]]
+    return render(request, 'stays/map.html', {"extent": extent})
+
+@conditional_stay
 def stay_detail(request, pk):
     obj = get_object_or_404(Stay, pk=pk)
     return render(request, "stays/stay_detail.html", {"stay": obj})
@@ -186,53 +321,22 @@ def stay_edit(request, pk):
         form = StayForm(instance=obj)
     return render(request, "stays/stay_form.html", {"form": form, "stay": obj})
 
-# --- Charts (basic, graceful if fields missing) ---
+# --- Charts (read from the precomputed totals in stays/stats.py) ---
+@conditional("stay_charts")
+@cache_response("stay_charts")
 def stay_charts(request):
-    """Three charts: by State, by Year (if date field exists), Rating distribution (if rating exists)."""
-    field_names = {getattr(f, "attname", None) or getattr(f, "name", None) for f in Stay._meta.get_fields()}
+    """Three charts: by State, by Year (check-in), Rating distribution."""
+    state_rows = [r for r in stats.rows(StayStat.STATE) if r[0]]
+    states = [key for key, *_ in state_rows]
+    states_series = [n for _, n, *_ in state_rows]
 
-    # 1) by State
-    state_counts = Stay.objects.values_list("state").exclude(state__isnull=True).exclude(state__exact="")
-    state_map = {}
-    for s, in state_counts:
-        state_map[s] = state_map.get(s, 0) + 1
-    states = sorted(state_map.keys())
-    states_series = [state_map[s] for s in states]
-
-    # 2) by Year (best-effort)
-    years_labels, years_series = [], []
-    date_field = None
-    for cand in ("date", "start_date", "arrival_date", "created", "created_at", "updated", "updated_at"):
-        if cand in field_names:
-            date_field = cand
-            break
-    if date_field:
-        qs_years = (Stay.objects.exclude(**{f"{date_field}__isnull": True})
-                    .annotate(y=ExtractYear(date_field))
-                    .values_list("y"))
-        ym = {}
-        for y, in qs_years:
-            if y is None:
-                continue
-            ym[y] = ym.get(y, 0) + 1
-        for y in sorted(ym.keys()):
-            years_labels.append(str(y))
-            years_series.append(ym[y])
-
-    # 3) Rating distribution
-    rating_labels, rating_series = [], []
-    if "rating" in field_names:
-        vals = Stay.objects.exclude(rating__isnull=True).values_list("rating", flat=True)
-        rm = {}
-        for r in vals:
-            try:
-                r = int(r)
-                rm[r] = rm.get(r, 0) + 1
-            except Exception:
-                continue
-        for r in sorted(rm.keys()):
-            rating_labels.append(str(r))
-            rating_series.append(rm[r])
+    year_rows = stats.by_year()
+    years_labels = [y for y, *_ in year_rows]
+    years_series = [n for _, n, *_ in year_rows]
+
+    rating_rows = sorted((r for r in stats.rows(StayStat.RATING) if r[0]), key=lambda r: int(r[0]))
+    rating_labels = [key for key, *_ in rating_rows]
+    rating_series = [n for _, n, *_ in rating_rows]
 
     ctx = {
         "states": json.dumps(states),
@@ -251,55 +355,52 @@ def appearance_view(request):
     return render(request, "appearance.html")
 
 def import_view(request):
-    """Import stays from a CSV file with columns: park,city,state,rating,latitude,longitude"""
+    """
+    Queue an uploaded CSV for background import (stays/jobs.py) and show its
+    progress page; the rows are not read inside this request.
+    """
     if request.method == "POST" and request.FILES.get('file'):
-        file = request.FILES['file']
-        try:
-            data = TextIOWrapper(file.file, encoding='utf-8')
-            reader = csv.DictReader(data)
-            count = 0
-            for row in reader:
-                # create or update a stay
-                s = Stay()
-                s.park = row.get('park') or ''
-                s.city = row.get('city') or ''
-                s.state = row.get('state') or ''
-                rating = row.get('rating')
-                try:
-                    s.rating = int(rating) if rating else None
-                except Exception:
-                    s.rating = None
-                s.latitude = float(row.get('latitude')) if row.get('latitude') else None
-                s.longitude = float(row.get('longitude')) if row.get('longitude') else None
-                s.save()
-                count += 1
-            messages.success(request, f"Imported {count} stays from file.")
-            return redirect('stays:list')
-        except Exception as e:
-            messages.error(request, f"Import failed: {e}")
-    return render(request, 'stays/import.html')
+        job = enqueue(request.FILES['file'])
+        return redirect('stays:import_job', pk=job.pk)
+    return render(request, 'stays/import.html', {'recent_jobs': ImportJob.objects.all()[:5]})
 
+
+def import_job(request, pk):
+    job = get_object_or_404(ImportJob, pk=pk)
+    return render(request, 'stays/import.html', {'job': job, 'recent_jobs': ImportJob.objects.all()[:5]})
+
+
+def import_job_status(request, pk):
+    """Polled by import.html while a job runs."""
+    job = get_object_or_404(ImportJob, pk=pk)
+    if job.status == ImportJob.RUNNING:
+        requeue_stale()  # picks the job up again if its worker died
+        job.refresh_from_db()
+    response = JsonResponse(job.progress())
+    response["Cache-Control"] = "no-store"
+    return response
+
+@conditional("export_view")
 def export_view(request):
     """
     Display a page with a download link and return a CSV of all stays when
     the `download` query parameter is present (e.g. ?download=1).
 
     The CSV contains columns: park, city, state, rating, latitude, longitude.
+    It is streamed; add ?gzip=1 to have it gzip-compressed in transit.
     """
     # If user requested download, stream the CSV file
     if request.GET.get('download'):
-        response = HttpResponse(content_type='text/csv')
         filename = f"stays_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        writer = csv.writer(response)
-        writer.writerow(['park', 'city', 'state', 'rating', 'latitude', 'longitude'])
-        for s in Stay.objects.all():
-            writer.writerow([s.park, s.city, s.state, s.rating, s.latitude, s.longitude])
-        return response
+        rows = (Stay.objects.order_by()
+                .values_list('park', 'city', 'state', 'rating', 'latitude', 'longitude')
+                .iterator(chunk_size=FETCH_SIZE))
+        return csv_response(request, filename, ['park', 'city', 'state', 'rating', 'latitude', 'longitude'], rows)
 
     # Otherwise render the export page with a link to download
-    return render(request, 'stays/export.html')
+    return render(request, 'stays/export.html', {"parquet_available": pa is not None})
 
+@conditional("export_home")
 def export_home(request):
     """Renders the Export page with simple stats/links."""
     total = Stay.objects.count()
@@ -309,107 +410,95 @@ def export_home(request):
         "total": total,
         "current_year": current_year,
         "this_year": this_year,
+        "parquet_available": pa is not None,
     })
 
+@conditional("export_stays_csv")
 def export_stays_csv(request):
     """
-    Downloads stays as CSV.
-    Optional filter: ?year=YYYY
+    Downloads stays as CSV, streamed.
+    Optional filter: ?year=YYYY; ?gzip=1 compresses it in transit.
     """
-    qs = Stay.objects.all().order_by("check_in", "city")
     year = request.GET.get("year")
-    if year and year.isdigit():
-        qs = qs.filter(check_in__year=int(year))
+    qs = year_filtered(Stay.objects.all().order_by("check_in", "city"), year)
 
-    response = HttpResponse(content_type="text/csv; charset=utf-8")
     fname = "stays_export.csv" if not year else f"stays_{year}.csv"
+    header = ["Park","City","State","Check In","Leave","Nights","Rate/Nt","Price/Night","Paid?"]
+    values = (qs.values_list("park", "city", "state", "check_in", "leave", "nights", "rate_per_night", "paid")
+              .iterator(chunk_size=FETCH_SIZE))
+    # Price/Night is rate_per_night again; there is no separate price field
+    rows = ((park or "", city or "", state or "", check_in or "", leave or "", nights or 0, rate or 0, rate or 0,
+             "Yes" if paid else "No")
+            for park, city, state, check_in, leave, nights, rate, paid in values)
+    return csv_response(request, fname, header, rows)
+
+@conditional("export_stays_parquet")
+def export_stays_parquet(request):
+    """
+    Downloads stays as a typed Parquet file, streamed one row group at a time.
+    Optional filter: ?year=YYYY (same as the CSV export).
+    """
+    if pa is None:
+        return HttpResponse("Parquet export needs the pyarrow package.", status=501, content_type="text/plain")
+    year = request.GET.get("year")
+    qs = year_filtered(Stay.objects.all().order_by("check_in", "city"), year)
+    fname = "stays_export.parquet" if not year else f"stays_{year}.parquet"
+    response = StreamingHttpResponse(parquet_chunks(stay_rows(qs)), content_type="application/vnd.apache.parquet")
     response["Content-Disposition"] = f'attachment; filename="{fname}"'
-    writer = csv.writer(response)
-    writer.writerow(["Park","City","State","Check In","Leave","Nights","Rate/Nt","Price/Night","Paid?"])
-    for s in qs:
-        writer.writerow([
-            s.park or "",
-            s.city or "",
-            s.state or "",
-            getattr(s, "check_in", "") or "",
-            getattr(s, "leave", "") or "",
-            getattr(s, "nights", 0) or 0,
-            getattr(s, "rate_per_night", 0) or 0,
-            getattr(s, "price_per_night", 0) or 0,
-            "Yes" if getattr(s, "paid", False) else "No",
-        ])
+    return response
+
+def export_changes(request):
+    """
+    Stays changed since ?since=<token> (all stays when omitted), as
+    ?format=csv (default), ndjson or parquet. Each row carries op
+    ("upsert" or "delete") and changed_at; the token for the next call is
+    in the X-Next-Since header.
+    """
+    fmt = request.GET.get("format", "csv")
+    if fmt not in ("csv", "ndjson", "parquet"):
+        return HttpResponse("format must be csv, ndjson or parquet", status=400, content_type="text/plain")
+    if fmt == "parquet" and pa is None:
+        return HttpResponse("Parquet export needs the pyarrow package.", status=501, content_type="text/plain")
+    try:
+        since, until = delta.window(request.GET.get("since"))
+    except ValueError as e:
+        return HttpResponse(str(e), status=400, content_type="text/plain")
+    rows = delta.delta_rows(since, until)
+    fname = f"stays_changes.{fmt}"
+    if fmt == "csv":
+        response = csv_response(request, fname, delta.DELTA_FIELDS, rows)
+    elif fmt == "ndjson":
+        response = stream_response(request, delta.ndjson_chunks(rows), "application/x-ndjson", fname)
+    else:
+        response = stream_response(request, parquet_chunks(rows, parquet_schema(delta.DELTA_FIELDS)),
+                                   "application/vnd.apache.parquet", fname)
+    response["X-Next-Since"] = delta.make_token(until)
     return response
 
 def charts_page(request):
     return render(request, "stays/charts.html")
 
+@conditional("stays_chart_data")
+@cache_response("stays_chart_data")
 def stays_chart_data(request):
-    # Example: total nights per state
-    qs = (Stay.objects
-                .values('state')
-                .annotate(nights=Sum('nights'), count=Count('id'))
-                .order_by('state'))
-    labels = [r['state'] or '—' for r in qs]
-    data = [int(r['nights'] or 0) for r in qs]
-    return JsonResponse({'labels': labels, 'datasets': [{'label': 'Nights', 'data': data}]})
-
-import io, csv as _csv
+    """
+    Chart series as {labels, datasets}. Defaults to total nights per state;
+    ?by=state|rating|time, ?bucket=day|week|month|year (time only),
+    ?series=nights,spend,paid_spend,stays,avg_rate (or all) and the
+    state/city/rating/year/from/to filters pick other charts.
+    """
+    try:
+        params = charts.parse_params(request.GET)
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return JsonResponse(charts.compute(params))
 
 def import_stays(request):
     if request.method == 'POST':
         form = StayImportForm(request.POST, request.FILES)
         if form.is_valid():
-            f = request.FILES['file']
-            raw = f.read()
-
-            # Try encodings (handles Windows-1252 mojibake)
-            text = None
-            for enc in ('utf-8-sig', 'cp1252'):
-                try:
-                    text = raw.decode(enc)
-                    break
-                except UnicodeDecodeError:
-                    pass
-            if text is None:
-                text = raw.decode('utf-8', errors='ignore')
-
-            reader = _csv.DictReader(io.StringIO(text))
-            created = updated = skipped = 0
-
-            for row in reader or []:
-                if not row:
-                    skipped += 1
-                    continue
-                row = { (k or '').strip().lower().replace('\ufeff',''): (v or '').strip() for k,v in row.items() }
-
-                park  = row.get('park','')
-                city  = row.get('city','')
-                state = row.get('state','')
-                check_in = row.get('check in') or row.get('check_in') or row.get('checkin') or ''
-                leave    = row.get('leave','')
-                try:
-                    nights = int(row.get('nights') or 0)
-                except:
-                    nights = 0
-                try:
-                    rate = float(row.get('rate/nt') or row.get('rate_per_night') or 0)
-                except:
-                    rate = 0.0
-                try:
-                    price = float(row.get('price/night') or row.get('price_per_night') or rate or 0)
-                except:
-                    price = 0.0
-                paid = (row.get('paid?') or row.get('paid') or '').lower() in ('yes','true','1','y')
-
-                obj, is_created = Stay.objects.update_or_create(
-                    park=park, city=city, state=state, check_in=check_in, leave=leave,
-                    defaults={'nights': nights, 'rate_per_night': rate, 'price_per_night': price, 'paid': paid}
-                )
-                created += int(is_created)
-                updated += int(not is_created)
-
-            messages.success(request, f'Import complete. Created {created}, updated {updated}, skipped {skipped}.')
-            return redirect('stay_list') if 'stay_list' in globals() or 'stay_list' in locals() else redirect('stays_import')
+            job = enqueue(request.FILES['file'])
+            return redirect('stays:import_job', pk=job.pk)
     else:
         form = StayImportForm()
     return render(request, 'stays/import.html', {'form': form})